@@ -3,127 +3,259 @@
 POSEパラメータから秒ごとの移動量を計算するスクリプト
 
 使用方法:
-python cal_moving_amount_by_sec.py <input_pose_file> <output_motion_file> <fps>
+python cal_moving_amount_by_sec.py <input_pose_file> <output_motion_file> <fps> [--cache-pose]
 
 引数:
 - input_pose_file: POSEパラメータファイル（7列X行）
 - output_motion_file: 出力ファイル（秒数,移動量の形式）
 - fps: フレームレート
+- --cache-pose: 読み込んだX,Z成分を .npy に保存し、次回以降はメモリマップで読み込む（同じPOSEファイルを繰り返し処理する場合向け）
 """
 
 import sys
 import math
+import functools
 import os
+import re
+import warnings
+import numpy as np
 
-def read_pose_data(file_path):
+# Numbaのカーネルで集計するPOSEデータの最小行数
+# （numbaの読み込みとキャッシュの読み込みに約0.35秒かかるため、NumPyより速くなるのは約1000万行以上）
+NUMBA_MIN_POSES = 10_000_000
+
+# セグメントファイル名から時間範囲を抽出する正規表現（例: "0-14sec.txt" -> "0", "14"）
+_SEGMENT_RE = re.compile(r'(\d+)-(\d+)sec\.txt')
+
+def get_pose_cache_path(file_path):
+    """
+    POSEファイルのX,Z成分を保存するキャッシュファイル（.npy）のパスを返す
+    
+    Args:
+        file_path (str): POSEファイルのパス
+        
+    Returns:
+        str: キャッシュファイルのパス（例: "0-14sec.txt" -> "0-14sec_xz.npy"）
+    """
+    return os.path.splitext(file_path)[0] + '_xz.npy'
+
+def read_pose_data(file_path, use_cache=False):
     """
     POSEファイルからX,Z成分（0列目=X, 2列目=Z）を読み込む
     
+    use_cache が True の場合、初回はテキストを解析してバイナリキャッシュ（.npy）に保存し、
+    POSEファイルより新しいキャッシュがあればメモリマップで読み込む
+    
     Args:
         file_path (str): POSEファイルのパス
+        use_cache (bool): Trueの場合はバイナリキャッシュを使用する
         
     Returns:
-        list: [(x, z), ...] の形式のリスト
+        numpy.ndarray: (N, 2) の配列（各行が [x, z]）
+    """
+    if not use_cache:
+        return parse_pose_text(file_path)
+        
+    cache_path = get_pose_cache_path(file_path)
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+            cached = np.load(cache_path, mmap_mode='r')
+            # 形式が異なるキャッシュ（別の処理で作成された .npy など）は使用しない
+            if cached.dtype == np.float32 and cached.ndim == 2 and cached.shape[1] == 2:
+                return cached
+    except (OSError, ValueError):
+        # キャッシュがない・壊れている場合はテキストから読み込む
+        pass
+        
+    xz_displacements = parse_pose_text(file_path)
+    
+    try:
+        np.save(cache_path, xz_displacements)
+    except OSError as e:
+        print(f"[WARNING] Could not save pose cache {cache_path}: {e}")
+        
+    return xz_displacements
+
+def parse_pose_text(file_path):
     """
-    xz_displacements = []
+    POSEファイル（テキスト）を解析してX,Z成分を読み込む
     
+    Args:
+        file_path (str): POSEファイルのパス
+        
+    Returns:
+        numpy.ndarray: (N, 2) の配列（各行が [x, z]）
+    """
     try:
-        with open(file_path, 'r') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                # スペース区切りで分割
-                values = line.split()
-                if len(values) < 2:
-                    print(f"[WARNING] Line {line_num}: Insufficient columns, skipping")
-                    continue
-                    
-                try:
-                    x = float(values[0])
-                    z = float(values[2])
-                    xz_displacements.append((x, z))
-                except ValueError as e:
-                    print(f"[WARNING] Line {line_num}: Invalid numeric values, skipping: {e}")
-                    continue
-                    
+        # スペース区切りでX,Z列のみ読み込み（空のファイルは空配列として扱う）
+        # メートル単位の変位はfloat32で十分な精度があるので、メモリ帯域を半分にするためfloat32で保持
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            xz_displacements = np.loadtxt(file_path, usecols=(0, 2), dtype=np.float32, ndmin=2).reshape(-1, 2)
     except FileNotFoundError:
         print(f"[ERROR] File not found: {file_path}")
         sys.exit(1)
+    except ValueError:
+        # 列数が不正な行・数値でない値を含む場合のみ、pandasで不正な行を除いて読み込む
+        xz_displacements = parse_pose_text_skipping_bad_lines(file_path)
     except Exception as e:
         print(f"[ERROR] Error reading file {file_path}: {e}")
         sys.exit(1)
+    
+    # 数値に変換できなかった行をスキップ
+    valid = ~np.isnan(xz_displacements).any(axis=1)
+    if not valid.all():
+        print(f"[WARNING] Skipping {np.count_nonzero(~valid)} lines with invalid numeric values")
+        xz_displacements = xz_displacements[valid]
         
     return xz_displacements
 
+def parse_pose_text_skipping_bad_lines(file_path):
+    """
+    POSEファイル（テキスト）を、列数が不正な行をスキップしながら読み込む
+    （数値に変換できない値はNaNとして返す）
+    
+    Args:
+        file_path (str): POSEファイルのパス
+        
+    Returns:
+        numpy.ndarray: (N, 2) の配列（各行が [x, z]）
+    """
+    # pandasは読み込みに時間がかかるため、不正な行を含むファイルの場合のみ読み込む
+    import pandas as pd
+    
+    try:
+        # スペース区切りでX,Z列のみをCパーサで読み込み（列数が不正な行はスキップ）
+        df = pd.read_csv(file_path, sep=r'\s+', usecols=[0, 2], header=None,
+                         engine='c', on_bad_lines='skip')
+    except pd.errors.EmptyDataError:
+        return np.zeros((0, 2), dtype=np.float32)
+    except Exception as e:
+        print(f"[ERROR] Error reading file {file_path}: {e}")
+        sys.exit(1)
+        
+    return df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+
 def calculate_frame_motion(xz_displacements):
     """
     フレーム間の移動量を計算（√(X²+Z²)）
     
     Args:
-        xz_displacements (list): [(x, z), ...] の形式のリスト
+        xz_displacements (numpy.ndarray): (N, 2) の配列（各行が [x, z]）
         
     Returns:
-        list: フレーム間の移動量のリスト
+        numpy.ndarray: フレーム間の移動量の配列（長さ N-1）
+    """
+    # フレーム間の変位を計算（X, Z）
+    d = np.diff(xz_displacements.astype(np.float64), axis=0)
+    
+    # 移動量を計算（√(X²+Z²)）
+    return np.hypot(d[:, 0], d[:, 1])
+
+def sum_motion_by_sec(frame_motions, fps, total_seconds):
     """
-    frame_motions = []
+    フレーム間の移動量を秒ごとに累積
     
-    for i in range(1, len(xz_displacements)):
-        prev_x, prev_z = xz_displacements[i-1]
-        curr_x, curr_z = xz_displacements[i]
+    Args:
+        frame_motions (numpy.ndarray): フレーム間の移動量の配列
+        fps (float): フレームレート
+        total_seconds (int): 秒数
+        
+    Returns:
+        numpy.ndarray: 秒ごとの移動量の配列（長さ total_seconds）
+    """
+    motion_sums = np.zeros(total_seconds)
+    
+    # 各秒の開始フレーム（秒ごとの区間 [int(s*fps), int((s+1)*fps)) の始点）
+    starts = np.floor(np.arange(total_seconds) * fps).astype(np.int64)
+    starts = starts[starts < len(frame_motions)]
+    
+    if len(starts) == 0:
+        return motion_sums
+    
+    # その秒に含まれるフレームの移動量を一括で累積
+    sums = np.add.reduceat(frame_motions, starts)
+    # reduceatは空区間（fps < 1 で開始フレームが重複する場合）に先頭要素を返すため0にする
+    sums[np.diff(starts, append=len(frame_motions)) == 0] = 0.0
+    motion_sums[:len(sums)] = sums
+    return motion_sums
+
+@functools.lru_cache(maxsize=1)
+def get_motion_by_sec_kernel():
+    """
+    Numbaでコンパイルした秒ごとの移動量の集計カーネルを取得（1回だけ作成）
+    
+    numbaは読み込みに時間がかかるため、NUMBA_MIN_POSES 行以上のPOSEデータを集計する場合のみ読み込む
+    
+    Returns:
+        function: _motion_by_sec をコンパイルした関数
+    """
+    from numba import njit
+    return njit(fastmath=True, cache=True, boundscheck=False)(_motion_by_sec)
+
+def _motion_by_sec(xz_displacements, fps, total_seconds):
+    """
+    フレーム間の移動量（√(X²+Z²)）を計算しながら秒ごとに累積する（1パス）
+    
+    Args:
+        xz_displacements (numpy.ndarray): (N, 2) の配列（各行が [x, z]）
+        fps (float): フレームレート
+        total_seconds (int): 秒数
+        
+    Returns:
+        numpy.ndarray: 秒ごとの移動量の配列（長さ total_seconds）
+    """
+    motion_sums = np.zeros(total_seconds)
+    second = 0
+    end_frame = int(fps)
+    
+    for i in range(1, xz_displacements.shape[0]):
+        # フレーム間移動量 i-1 が属する秒（区間 [int(s*fps), int((s+1)*fps))）まで進める
+        while i - 1 >= end_frame:
+            second += 1
+            end_frame = int((second + 1) * fps)
         
         # フレーム間の変位を計算（X, Z）
-        dx = curr_x - prev_x
-        dz = curr_z - prev_z
+        dx = xz_displacements[i, 0] - xz_displacements[i-1, 0]
+        dz = xz_displacements[i, 1] - xz_displacements[i-1, 1]
         
-        # 移動量を計算（√(X²+Z²)）
-        motion = math.sqrt(dx*dx + dz*dz)
-        frame_motions.append(motion)
+        if second < total_seconds:
+            motion_sums[second] += math.sqrt(dx*dx + dz*dz)
         
-    return frame_motions
+    return motion_sums
 
-def aggregate_by_second(frame_motions, fps, start_second=0):
+def aggregate_by_second(xz_displacements, fps, start_second=0):
     """
     FPSに基づいて秒ごとの移動量を累積
+    （NUMBA_MIN_POSES 行以上の場合は、フレーム間の移動量の配列を作らずNumbaのカーネルで直接秒ごとに集計する）
     
     Args:
-        frame_motions (list): フレーム間の移動量のリスト
+        xz_displacements (numpy.ndarray): (N, 2) の配列（各行が [x, z]）
         fps (float): フレームレート
         start_second (int): 開始秒数（デフォルト: 0）
         
     Returns:
-        list: [(秒数, 移動量), ...] の形式のリスト
+        numpy.ndarray: (秒数, 2) の配列（各行が [秒数, 移動量]）
     """
-    per_second_motions = []
+    # フレーム間の移動量の数をFPSで割って秒数を計算
+    num_frame_motions = max(len(xz_displacements) - 1, 0)
+    total_seconds = math.ceil(num_frame_motions / fps)
     
-    # フレーム数をFPSで割って秒数を計算
-    total_seconds = math.ceil(len(frame_motions) / fps)
+    if len(xz_displacements) >= NUMBA_MIN_POSES:
+        motion_sums = get_motion_by_sec_kernel()(np.ascontiguousarray(xz_displacements), float(fps), total_seconds)
+    else:
+        motion_sums = sum_motion_by_sec(calculate_frame_motion(xz_displacements), fps, total_seconds)
     
-    for second in range(total_seconds):
-        start_frame = int(second * fps)
-        end_frame = int((second + 1) * fps)
-        
-        # その秒に含まれるフレームの移動量を累積
-        motion_sum = 0.0
-        frame_count = 0
-        
-        for frame_idx in range(start_frame, min(end_frame, len(frame_motions))):
-            motion_sum += frame_motions[frame_idx]
-            frame_count += 1
-            
-        # 開始秒数を加算して絶対秒数に変換
-        absolute_second = start_second + second
-        per_second_motions.append((absolute_second, motion_sum))
-        
-    return per_second_motions
+    # 開始秒数を加算して絶対秒数に変換
+    seconds = np.arange(start_second, start_second + total_seconds)
+    return np.stack([seconds, motion_sums], axis=1)
 
 def save_motion_data(per_second_motions, output_file):
     """
     秒ごとの移動量をファイルに保存
     
     Args:
-        per_second_motions (list): [(秒数, 移動量), ...] の形式のリスト
+        per_second_motions (numpy.ndarray): (秒数, 2) の配列（各行が [秒数, 移動量]）
         output_file (str): 出力ファイルのパス
     """
     try:
@@ -132,12 +264,11 @@ def save_motion_data(per_second_motions, output_file):
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
             
+        # 全行をまとめて整形し、ヘッダー行と一緒に一括で書き出し
+        lines = [f"{int(second)},{motion:.6f}\n" for second, motion in per_second_motions.tolist()]
         with open(output_file, 'w') as f:
-            # ヘッダー行を追加
             f.write("second,motion_amount\n")
-            
-            for second, motion in per_second_motions:
-                f.write(f"{second},{motion:.6f}\n")
+            f.writelines(lines)
                 
         print(f"[INFO] Saved motion data to: {output_file}")
         
@@ -155,11 +286,9 @@ def extract_start_second_from_filename(output_file):
     Returns:
         int: 開始秒数
     """
-    import re
-    
     # ファイル名から時間範囲を抽出（例: "0-14sec.txt" -> "0-14"）
     filename = os.path.basename(output_file)
-    match = re.search(r'(\d+)-(\d+)sec\.txt', filename)
+    match = _SEGMENT_RE.search(filename)
     
     if match:
         start_sec = int(match.group(1))
@@ -169,15 +298,20 @@ def extract_start_second_from_filename(output_file):
         return 0
 
 def main():
-    if len(sys.argv) != 4:
-        print("Usage: python cal_moving_amount_by_sec.py <input_pose_file> <output_motion_file> <fps>")
+    # "--" で始まる引数はオプションとして扱う
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    
+    if len(args) != 3 or any(option != '--cache-pose' for option in options):
+        print("Usage: python cal_moving_amount_by_sec.py <input_pose_file> <output_motion_file> <fps> [--cache-pose]")
         sys.exit(1)
         
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+    input_file = args[0]
+    output_file = args[1]
+    cache_pose = '--cache-pose' in options
     
     try:
-        fps = float(sys.argv[3])
+        fps = float(args[2])
         if fps <= 0:
             raise ValueError("FPS must be positive")
     except ValueError as e:
@@ -191,24 +325,20 @@ def main():
     print(f"[INFO] Output: {output_file}")
     print(f"[INFO] FPS: {fps}")
     print(f"[INFO] Start second: {start_second}")
+    print(f"[INFO] Cache pose data: {cache_pose}")
     
     # ステップ1: POSEファイルから最初2列（X,Y変位）を読み込み
     print("[INFO] Step 1: Reading pose data...")
-    xy_displacements = read_pose_data(input_file)
+    xy_displacements = read_pose_data(input_file, cache_pose)
     print(f"[INFO] Read {len(xy_displacements)} pose data points")
     
     if len(xy_displacements) < 2:
         print("[ERROR] Insufficient pose data (need at least 2 points)")
         sys.exit(1)
         
-    # ステップ2-1: フレーム間の移動量を計算
-    print("[INFO] Step 2-1: Calculating frame-to-frame motion...")
-    frame_motions = calculate_frame_motion(xy_displacements)
-    print(f"[INFO] Calculated {len(frame_motions)} frame motions")
-    
-    # ステップ2-2: 秒ごとの移動量を累積
-    print("[INFO] Step 2-2: Aggregating motion by second...")
-    per_second_motions = aggregate_by_second(frame_motions, fps, start_second)
+    # ステップ2: フレーム間の移動量を計算し、秒ごとに累積
+    print("[INFO] Step 2: Calculating frame-to-frame motion and aggregating by second...")
+    per_second_motions = aggregate_by_second(xy_displacements, fps, start_second)
     print(f"[INFO] Calculated motion for {len(per_second_motions)} seconds")
     
     # ステップ3: 結果をファイルに保存
@@ -3,7 +3,7 @@
 しきい値に基づく歩行分類を行い、結果を動画に描画して保存するスクリプト
 
 使用方法:
-python create_walking_classification_video.py <video_path> <motion_per_sec_dir> <class_result_dir> <fps> <slam_duration_sec> <walking_threshold1> <walking_threshold2> <video_name>
+python create_walking_classification_video.py <video_path> <motion_per_sec_dir> <class_result_dir> <fps> <slam_duration_sec> <walking_threshold1> <walking_threshold2> <video_name> [frame_stride]
 
 引数:
 - video_path: 元動画ファイルのパス
@@ -14,15 +14,73 @@ python create_walking_classification_video.py <video_path> <motion_per_sec_dir>
 - walking_threshold1: WALKING判定のしきい値
 - walking_threshold2: HOLD判定のしきい値
 - video_name: 動画名
+- frame_stride: 出力するフレームの間隔（省略時: 1 = 全フレーム、例: fps を指定すると1秒1フレームのプレビュー動画）
 """
 
 import sys
 import os
-import csv
-from collections import defaultdict
+import warnings
+import functools
+import queue
+import shutil
+import subprocess
+import threading
 import numpy as np
 import cv2
 
+# 分類コード
+STAYING, HOLD, WALKING = 0, 1, 2
+# 分類コードごとの (ラベル, 色)（BGR）
+CLASS_LABELS = (
+    ("STAYING", (0, 0, 200)),  # red-ish (BGR)
+    ("HOLD", (0, 200, 200)),   # yellow-ish
+    ("WALKING", (0, 200, 0)),  # green
+)
+
+# 動画処理パイプラインのキューの最大長と描画スレッド数
+FRAME_QUEUE_SIZE = 32
+NUM_DRAW_WORKERS = 2
+# 停止を確認するためのキューの待ち時間（秒）
+QUEUE_POLL_SEC = 0.1
+
+def list_segment_files(motion_per_sec_dir):
+    """
+    秒ごとの移動量データディレクトリ内のセグメントファイルを列挙する
+    
+    Args:
+        motion_per_sec_dir (str): 秒ごとの移動量データディレクトリ
+        
+    Returns:
+        list: セグメントファイルのパスのリスト（ファイル名順）
+    """
+    # DirEntryのキャッシュ済みの名前・種別を使い、ファイルごとのstatを省く
+    with os.scandir(motion_per_sec_dir) as it:
+        return sorted(entry.path for entry in it if entry.name.endswith('sec.txt') and entry.is_file())
+
+def read_segment_file(segment_path):
+    """
+    秒ごとの移動量データのセグメントファイルを読み込む
+    
+    Args:
+        segment_path (str): セグメントファイルのパス
+        
+    Returns:
+        numpy.ndarray: (行数, 2) の配列（各行が [秒数, 移動量]）
+    """
+    try:
+        # 期待フォーマット: ヘッダー行 + 秒数, 移動量（ヘッダーのみのファイルは空配列として扱う）
+        # （古いnumpyでは空のファイルが (0, 1) になり他のファイルと連結できないため、(N, 2) に揃える）
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            return np.loadtxt(segment_path, delimiter=',', skiprows=1, usecols=(0, 1), ndmin=2).reshape(-1, 2)
+    except ValueError:
+        # 不正な行を含む場合はpandasで不正な行を除いて読み込む
+        # （pandasは読み込みに時間がかかるため、この場合のみ読み込む）
+        import pandas as pd
+        print(f"[WARNING] Skipping invalid rows in {os.path.basename(segment_path)}")
+        df = pd.read_csv(segment_path, usecols=[0, 1], engine='c', on_bad_lines='skip')
+        return df.apply(pd.to_numeric, errors='coerce').dropna().to_numpy(dtype=np.float64)
+
 def read_motion_data(motion_per_sec_dir):
     """
     秒ごとの移動量データを読み込む
@@ -31,70 +89,173 @@ def read_motion_data(motion_per_sec_dir):
         motion_per_sec_dir (str): 秒ごとの移動量データディレクトリ
         
     Returns:
-        dict: {秒数: 移動量} の辞書
+        tuple: (移動量の配列, データが存在する秒のマスク) （どちらもインデックス = 秒数）
     """
-    sec_to_motion = {}
-    segment_files = [f for f in os.listdir(motion_per_sec_dir) if f.endswith('.txt') and 'sec.txt' in f]
+    segment_files = list_segment_files(motion_per_sec_dir)
+    if not segment_files:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool)
 
-    for segment_file in sorted(segment_files):
-        segment_path = os.path.join(motion_per_sec_dir, segment_file)
-        # ファイル名から時間範囲を取得（例: 0-14sec.txt -> start=0, end=14）
-        time_range = segment_file.replace('sec.txt', '')
-        start_sec, end_sec = map(int, time_range.split('-'))
-        
-        with open(segment_path, 'r') as f:
-            reader = csv.reader(f, delimiter=',')  # カンマ区切りに変更
-            header = next(reader)  # ヘッダー行をスキップ
-            for row in reader:
-                if not row or len(row) < 2:
-                    continue
-                try:
-                    # 期待フォーマット: 秒数, 移動量
-                    sec = int(float(row[0]))
-                    motion_amount = float(row[1])
-                    sec_to_motion[sec] = motion_amount
-                except Exception as e:
-                    print(f"[WARNING] Skipping invalid row in {segment_file}: {row}, Error: {e}")
-                    continue
-
-    return sec_to_motion
-
-def classify_motion(sec_to_motion, walking_threshold1, walking_threshold2):
+    # 全セグメントを読み込んで連結
+    data = np.concatenate([read_segment_file(segment_path) for segment_path in segment_files])
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool)
+
+    # 同じ秒が複数ある場合は後のセグメントの値を使用
+    secs = data[:, 0].astype(np.int64)
+    _, last_from_end = np.unique(secs[::-1], return_index=True)
+    keep = len(secs) - 1 - last_from_end
+    secs = secs[keep]
+
+    # 秒数をインデックスとする密な配列に格納（データがない秒は0、メモリ帯域削減のためfloat32）
+    motion_arr = np.zeros(secs.max() + 1, dtype=np.float32)
+    valid_mask = np.zeros(secs.max() + 1, dtype=bool)
+    motion_arr[secs] = data[keep, 1]
+    valid_mask[secs] = True
+
+    return motion_arr, valid_mask
+
+def classify_motion(motion_arr, walking_threshold1, walking_threshold2):
     """
     移動量に基づいて歩行状態を分類
     
     Args:
-        sec_to_motion (dict): {秒数: 移動量} の辞書
+        motion_arr (numpy.ndarray): 秒ごとの移動量の配列（インデックス = 秒数）
         walking_threshold1 (float): WALKING判定のしきい値
         walking_threshold2 (float): HOLD判定のしきい値
         
     Returns:
-        dict: {秒数: (ラベル, 色)} の辞書
+        numpy.ndarray: 秒ごとの分類コードの配列（CLASS_LABELS のインデックス）
+    """
+    return np.where(motion_arr >= walking_threshold1, WALKING,
+                    np.where(motion_arr >= walking_threshold2, HOLD, STAYING)).astype(np.int8)
+
+def select_video_encoder():
+    """
+    ffmpegで使用するH.264エンコーダを選択（NVENCが使用可能ならNVENC、なければlibx264）
+    
+    Returns:
+        list: ffmpegのエンコーダ指定オプション
+    """
+    nvenc_options = ['-c:v', 'h264_nvenc', '-preset', 'p1']
+    
+    # 短いテスト映像を本番と同じオプションのNVENCでエンコードできるか確認
+    # （GPU/ドライバがない場合や、プリセット p1 に対応していない ffmpeg 4.3 より前のビルドでは失敗する）
+    probe_cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error',
+                 '-f', 'lavfi', '-i', 'color=c=black:s=256x256:d=0.1',
+                 *nvenc_options, '-f', 'null', '-']
+    try:
+        if subprocess.run(probe_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30).returncode == 0:
+            return nvenc_options
+    except (OSError, subprocess.TimeoutExpired):
+        pass
+    return ['-c:v', 'libx264', '-preset', 'ultrafast', '-threads', '0']
+
+class FFmpegVideoWriter:
+    """
+    BGRの生フレームをffmpegのパイプに書き込んで動画をエンコードする
+    （cv2.VideoWriter と同じ write / release で使用できる）
+    """
+    
+    def __init__(self, out_path, fps, frame_size):
+        """
+        Args:
+            out_path (str): 出力動画ファイルのパス
+            fps (float): フレームレート
+            frame_size (tuple): (幅, 高さ)
+        """
+        w, h = frame_size
+        cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{w}x{h}", '-r', str(fps), '-i', '-',
+               '-an', *select_video_encoder(),
+               # yuv420p は幅・高さが偶数である必要があるため、奇数の場合は1px埋める
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+               out_path]
+        self.out_path = out_path
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    
+    def write(self, frame):
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            # ffmpeg が途中で終了した（エンコーダがない・出力先に書き込めない等）
+            self._fail()
+    
+    def release(self):
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            self._fail()
+        if self.proc.wait() != 0:
+            self._fail()
+    
+    def _fail(self):
+        returncode = self.proc.wait()
+        print(f"[ERROR] ffmpeg failed to encode video (exit code {returncode}): {self.out_path}")
+        sys.exit(1)
+
+@functools.lru_cache(maxsize=16)
+def build_label_overlay(text, color):
+    """
+    ラベル表示用の合成係数を作成（背景を半透明の黒にして、その上に文字を描画する）
+    （ラベルは1秒ごとにしか変わらないため、同じ (ラベル, 秒) の組ではキャッシュを再利用する）
+    
+    Args:
+        text (str): 描画する文字列
+        color (tuple): 文字色（BGR）
+        
+    Returns:
+        tuple: (背景の重み, 前景) の配列。合成後の画素 = 背景 * 背景の重み + 前景
     """
-    sec_to_label = {}
-    max_sec = max(sec_to_motion.keys())
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.8
+    thickness = 2
     
-    for s in range(0, max_sec + 1):
-        mv = sec_to_motion.get(s, 0.0)
-        if mv >= walking_threshold1:
-            sec_to_label[s] = ("WALKING", (0, 200, 0))  # green
-        elif mv >= walking_threshold2:
-            sec_to_label[s] = ("HOLD", (0, 200, 200))   # yellow-ish
-        else:
-            sec_to_label[s] = ("STAYING", (0, 0, 200))  # red-ish (BGR)
+    # 文字の背景用の矩形（文字サイズ + 余白10px）内の文字の被覆率（アンチエイリアス込み）
+    (tw, th), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+    coverage = np.zeros((th + 11, tw + 11), dtype=np.uint8)
+    cv2.putText(coverage, text, (5, th + 2), font, font_scale, 255, thickness, cv2.LINE_AA)
+    alpha = (coverage.astype(np.float32) / 255.0)[..., None]
     
-    return sec_to_label
+    # 背景は黒と50%で合成し、文字部分は文字色で上書き（+0.5 は uint8 への丸め用）
+    background_weight = 0.5 * (1.0 - alpha)
+    foreground = alpha * np.array(color, dtype=np.float32) + 0.5
+    return background_weight, foreground
 
-def create_classification_video(video_path, sec_to_label, class_result_dir, video_name, fps):
+def draw_classification(frame, frame_idx, frame_to_sec, sec_labels, fps):
+    """
+    フレームに分類結果のラベルを描画
+    
+    Args:
+        frame (numpy.ndarray): 描画対象のフレーム（BGR）
+        frame_idx (int): フレーム番号
+        frame_to_sec (list): フレーム番号ごとの秒数のリスト
+        sec_labels (list): 秒ごとの (ラベル, 色) のリスト
+        fps (float): フレームレート
+    """
+    # 対応する秒を取得（DPVOの集計と整合性をとるため FPS を使用、総フレーム数を超える場合はその場で算出）
+    sec = frame_to_sec[frame_idx] if frame_idx < len(frame_to_sec) else int(frame_idx / fps)
+    label, color = sec_labels[sec] if sec < len(sec_labels) else CLASS_LABELS[STAYING]
+    background_weight, foreground = build_label_overlay(f"{label} (sec {sec})", color)
+    
+    # 左上の領域を1回の合成で描画（フレームからはみ出す部分は切り捨て）
+    x0, y0 = 10, 10
+    roi = frame[y0:y0+foreground.shape[0], x0:x0+foreground.shape[1]]
+    h, w = roi.shape[:2]
+    roi[:] = roi * background_weight[:h, :w] + foreground[:h, :w]
+
+def create_classification_video(video_path, sec_to_class, class_result_dir, video_name, fps, frame_stride=1):
     """
     分類結果を動画に描画して保存
     
+    読み込み（デコード）・描画・書き出し（エンコード）をキューでつないだ別スレッドで並行に処理する
+    
     Args:
         video_path (str): 元動画ファイルのパス
-        sec_to_label (dict): {秒数: (ラベル, 色)} の辞書
+        sec_to_class (numpy.ndarray): 秒ごとの分類コードの配列
         class_result_dir (str): 出力ディレクトリ
         video_name (str): 動画名
         fps (float): フレームレート
+        frame_stride (int): 出力するフレームの間隔（間引いたフレームはデコードしない）
     """
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
@@ -104,58 +265,147 @@ def create_classification_video(video_path, sec_to_label, class_result_dir, vide
     orig_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     orig_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     orig_fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
     
-    # 描画用fpsは元動画fpsを使用
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    # フレーム番号 -> 秒数、秒数 -> (ラベル, 色) の対応を事前に作成し、フレームごとの除算・分岐を省く
+    frame_to_sec = (np.arange(total_frames) / fps).astype(np.int64).tolist()
+    sec_labels = [CLASS_LABELS[code] for code in sec_to_class.tolist()]
+    
+    # 描画用fpsは元動画fpsを使用（フレームを間引く場合はその分下げる）
+    out_fps = (orig_fps if orig_fps > 0 else fps) / frame_stride
     out_path = os.path.join(class_result_dir, f"{video_name}_classified.mp4")
-    writer = cv2.VideoWriter(out_path, fourcc, orig_fps if orig_fps > 0 else fps, (orig_w, orig_h))
+    # エンコードはマルチスレッド/ハードウェアエンコーダを使えるffmpegで行う
+    if shutil.which('ffmpeg'):
+        writer = FFmpegVideoWriter(out_path, out_fps, (orig_w, orig_h))
+    else:
+        print("[WARNING] ffmpeg not found, falling back to cv2.VideoWriter")
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        writer = cv2.VideoWriter(out_path, fourcc, out_fps, (orig_w, orig_h))
 
-    frame_idx = 0
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    font_scale = 0.8
-    thickness = 2
+    raw_queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+    drawn_queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+    errors = []
+    # いずれかのスレッドでエラーが起きた場合や書き出しに失敗した場合に全スレッドを止める
+    stop = threading.Event()
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        # 対応する秒を算出（DPVOの集計と整合性をとるため FPS を使用）
-        sec = int(frame_idx / fps)
-        label, color = sec_to_label.get(sec, ("STAYING", (0, 0, 200)))
-        text = f"{label} (sec {sec})"
-        
-        # 文字の背景用に半透明矩形を描く
-        (tw, th), baseline = cv2.getTextSize(text, font, font_scale, thickness)
-        x0, y0 = 10, 10
-        cv2.rectangle(frame, (x0, y0), (x0 + tw + 10, y0 + th + 10), (0, 0, 0), -1)
-        cv2.addWeighted(frame[y0:y0+th+10, x0:x0+tw+10], 0.5, frame[y0:y0+th+10, x0:x0+tw+10], 0.5, 0, frame[y0:y0+th+10, x0:x0+tw+10])
-        cv2.putText(frame, text, (x0 + 5, y0 + th + 2), font, font_scale, color, thickness, cv2.LINE_AA)
+    def put(q, item):
+        # 中断時に満杯のキューで待ち続けないよう、停止を確認しながら送る
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=QUEUE_POLL_SEC)
+                return
+            except queue.Full:
+                pass
+
+    def get(q):
+        # 停止を確認しながら受け取る（停止した場合は None）
+        while not stop.is_set():
+            try:
+                return q.get(timeout=QUEUE_POLL_SEC)
+            except queue.Empty:
+                pass
+        return None
+
+    def read_frames():
+        # 読み込みスレッド: デコードしたフレームを (出力フレーム番号, 元のフレーム番号, フレーム) で raw_queue に送る
+        try:
+            out_idx = 0
+            frame_idx = 0
+            while not stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                put(raw_queue, (out_idx, frame_idx, frame))
+                out_idx += 1
+                frame_idx += 1
+                # 間引くフレームは grab() のみ（色変換などのデコード後処理を省略）
+                for _ in range(frame_stride - 1):
+                    if not cap.grab():
+                        break
+                    frame_idx += 1
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for _ in range(NUM_DRAW_WORKERS):
+                put(raw_queue, None)
+
+    def draw_frames():
+        # 描画スレッド: ラベルを描画したフレームを drawn_queue に送る
+        try:
+            while True:
+                item = get(raw_queue)
+                if item is None:
+                    break
+                out_idx, frame_idx, frame = item
+                draw_classification(frame, frame_idx, frame_to_sec, sec_labels, fps)
+                put(drawn_queue, (out_idx, frame))
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(drawn_queue, None)
 
-        writer.write(frame)
-        frame_idx += 1
+    reader = threading.Thread(target=read_frames, daemon=True)
+    drawers = [threading.Thread(target=draw_frames, daemon=True) for _ in range(NUM_DRAW_WORKERS)]
+    reader.start()
+    for drawer in drawers:
+        drawer.start()
+
+    # 書き出し（メインスレッド）: 描画スレッド間で前後したフレームを番号順に並べ直して書き出す
+    # （エラーで止まったフレームの後続が pending に溜まり続けないよう、停止したら直ちに抜ける）
+    try:
+        pending = {}
+        next_idx = 0
+        finished = 0
+        while finished < NUM_DRAW_WORKERS:
+            item = get(drawn_queue)
+            if stop.is_set():
+                break
+            if item is None:
+                finished += 1
+                continue
+            out_idx, frame = item
+            pending[out_idx] = frame
+            while next_idx in pending:
+                writer.write(pending.pop(next_idx))
+                next_idx += 1
+    finally:
+        # 書き出しに失敗した場合も含め、スレッドを止めてから終了する
+        stop.set()
+        reader.join()
+        for drawer in drawers:
+            drawer.join()
+
+    if errors:
+        print(f"[ERROR] Error while creating classification video: {errors[0]}")
+        cap.release()
+        sys.exit(1)
 
     cap.release()
     writer.release()
     print(f"[INFO] Saved classified video: {out_path}")
 
-def save_statistics(sec_to_motion, motion_per_sec_dir, video_name, slam_duration_sec, segment_files):
+def save_statistics(motion_arr, valid_mask, motion_per_sec_dir, video_name, slam_duration_sec, segment_files):
     """
     統計情報をファイルに保存
     
     Args:
-        sec_to_motion (dict): {秒数: 移動量} の辞書
+        motion_arr (numpy.ndarray): 秒ごとの移動量の配列（インデックス = 秒数）
+        valid_mask (numpy.ndarray): データが存在する秒のマスク
         motion_per_sec_dir (str): 統計ファイルの保存ディレクトリ
         video_name (str): 動画名
         slam_duration_sec (int): SLAMセグメントの長さ
         segment_files (list): セグメントファイルのリスト
     """
-    max_sec = max(sec_to_motion.keys())
+    max_sec = len(motion_arr) - 1
+    valid_motion = motion_arr[valid_mask]
     
-    # 1分ごとの移動量の棒グラフ
-    minute_to_sum = defaultdict(float)
-    for s, v in sec_to_motion.items():
-        minute_to_sum[s // 60] += v
+    # 1分ごとの移動量の合計（データが存在する分のみ出力）
+    n_minutes = (max_sec // 60) + 1
+    minute_idx = np.arange(max_sec + 1) // 60
+    minute_sums = np.bincount(minute_idx, weights=motion_arr, minlength=n_minutes)
+    minute_has_data = np.bincount(minute_idx, weights=valid_mask, minlength=n_minutes) > 0
     
     # 統合された統計情報を出力
     stats_file = os.path.join(motion_per_sec_dir, f"{video_name}_integrated_stats.txt")
@@ -165,21 +415,20 @@ def save_statistics(sec_to_motion, motion_per_sec_dir, video_name, slam_duration
         f.write(f"Total duration: {max_sec + 1} seconds\n")
         f.write(f"Number of segments: {len(segment_files)}\n")
         f.write(f"Segment duration: {slam_duration_sec} seconds\n")
-        f.write(f"Total motion: {sum(sec_to_motion.values()):.6f}\n")
-        f.write(f"Average motion per second: {np.mean(list(sec_to_motion.values())):.6f}\n")
-        f.write(f"Max motion per second: {np.max(list(sec_to_motion.values())):.6f}\n")
-        f.write(f"Min motion per second: {np.min(list(sec_to_motion.values())):.6f}\n")
+        f.write(f"Total motion: {valid_motion.sum(dtype=np.float64):.6f}\n")
+        f.write(f"Average motion per second: {valid_motion.mean(dtype=np.float64):.6f}\n")
+        f.write(f"Max motion per second: {valid_motion.max():.6f}\n")
+        f.write(f"Min motion per second: {valid_motion.min():.6f}\n")
         
         # 1分ごとの統計
         f.write(f"\nPer-minute statistics:\n")
-        for m in sorted(minute_to_sum.keys()):
-            f.write(f"Minute {m}: {minute_to_sum[m]:.6f}\n")
+        f.write("".join(f"Minute {m}: {minute_sums[m]:.6f}\n" for m in np.flatnonzero(minute_has_data)))
 
     print(f"[INFO] Saved integrated statistics: {stats_file}")
 
 def main():
-    if len(sys.argv) != 9:
-        print("Usage: python create_walking_classification_video.py <video_path> <motion_per_sec_dir> <class_result_dir> <fps> <slam_duration_sec> <walking_threshold1> <walking_threshold2> <video_name>")
+    if len(sys.argv) not in (9, 10):
+        print("Usage: python create_walking_classification_video.py <video_path> <motion_per_sec_dir> <class_result_dir> <fps> <slam_duration_sec> <walking_threshold1> <walking_threshold2> <video_name> [frame_stride]")
         sys.exit(1)
         
     video_path = sys.argv[1]
@@ -190,6 +439,10 @@ def main():
     walking_threshold1 = float(sys.argv[6])
     walking_threshold2 = float(sys.argv[7])
     video_name = sys.argv[8]
+    frame_stride = int(sys.argv[9]) if len(sys.argv) == 10 else 1
+    if frame_stride < 1:
+        print(f"[ERROR] Invalid frame stride: {frame_stride}")
+        sys.exit(1)
     
     print(f"[INFO] Video path: {video_path}")
     print(f"[INFO] Motion per sec directory: {motion_per_sec_dir}")
@@ -199,6 +452,7 @@ def main():
     print(f"[INFO] Walking threshold 1: {walking_threshold1}")
     print(f"[INFO] Walking threshold 2: {walking_threshold2}")
     print(f"[INFO] Video name: {video_name}")
+    print(f"[INFO] Frame stride: {frame_stride}")
     
     # 出力ディレクトリが存在しない場合は作成
     if not os.path.exists(class_result_dir):
@@ -207,27 +461,27 @@ def main():
     
     # 秒ごとの移動量データを読み込み
     print("[INFO] Reading motion data...")
-    sec_to_motion = read_motion_data(motion_per_sec_dir)
+    motion_arr, valid_mask = read_motion_data(motion_per_sec_dir)
     
-    if not sec_to_motion:
+    if not valid_mask.any():
         print(f"[ERROR] No motion data found in {motion_per_sec_dir}")
         sys.exit(1)
     
-    max_sec = max(sec_to_motion.keys())
+    max_sec = len(motion_arr) - 1
     print(f"[INFO] Integrated motion data: 0-{max_sec} seconds")
     
     # 歩行状態を分類
     print("[INFO] Classifying motion...")
-    sec_to_label = classify_motion(sec_to_motion, walking_threshold1, walking_threshold2)
+    sec_to_class = classify_motion(motion_arr, walking_threshold1, walking_threshold2)
     
     # 分類結果を動画に描画して保存
     print("[INFO] Creating classification video...")
-    create_classification_video(video_path, sec_to_label, class_result_dir, video_name, fps)
+    create_classification_video(video_path, sec_to_class, class_result_dir, video_name, fps, frame_stride)
     
     # 統計情報を保存
     print("[INFO] Saving statistics...")
-    segment_files = [f for f in os.listdir(motion_per_sec_dir) if f.endswith('.txt') and 'sec.txt' in f]
-    save_statistics(sec_to_motion, motion_per_sec_dir, video_name, slam_duration_sec, segment_files)
+    segment_files = list_segment_files(motion_per_sec_dir)
+    save_statistics(motion_arr, valid_mask, motion_per_sec_dir, video_name, slam_duration_sec, segment_files)
     
     print("[INFO] Processing completed successfully")
 
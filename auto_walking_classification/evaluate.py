@@ -16,7 +16,10 @@ python evaluate.py <video_name> <motion_per_sec_dir> <class_result_dir> <walking
 
 import sys
 import os
-import csv
+import io
+import contextlib
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import matplotlib
 matplotlib.use('Agg')
@@ -24,7 +27,6 @@ import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 
 
-
 def read_annotation_data(annotation_dir, video_name):
     """
     正解データを読み込む
@@ -66,6 +68,44 @@ def read_annotation_data(annotation_dir, video_name):
     
     return annotation_data
 
+def list_segment_files(motion_per_sec_dir):
+    """
+    秒ごとの移動量データディレクトリ内のセグメントファイルを列挙する
+    
+    Args:
+        motion_per_sec_dir (str): 秒ごとの移動量データディレクトリ
+        
+    Returns:
+        list: セグメントファイルのパスのリスト（ファイル名順）
+    """
+    # DirEntryのキャッシュ済みの名前・種別を使い、ファイルごとのstatを省く
+    with os.scandir(motion_per_sec_dir) as it:
+        return sorted(entry.path for entry in it if entry.name.endswith('sec.txt') and entry.is_file())
+
+def read_segment_file(segment_path):
+    """
+    秒ごとの移動量データのセグメントファイルを読み込む
+    
+    Args:
+        segment_path (str): セグメントファイルのパス
+        
+    Returns:
+        numpy.ndarray: (行数, 2) の配列（各行が [秒数, 移動量]）
+    """
+    try:
+        # 期待フォーマット: ヘッダー行 + 秒数, 移動量（ヘッダーのみのファイルは空配列として扱う）
+        # （古いnumpyでは空のファイルが (0, 1) になり他のファイルと連結できないため、(N, 2) に揃える）
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            return np.loadtxt(segment_path, delimiter=',', skiprows=1, usecols=(0, 1), ndmin=2).reshape(-1, 2)
+    except ValueError:
+        # 不正な行を含む場合はpandasで不正な行を除いて読み込む
+        # （pandasは読み込みに時間がかかるため、この場合のみ読み込む）
+        import pandas as pd
+        print(f"[WARNING] Skipping invalid rows in {os.path.basename(segment_path)}")
+        df = pd.read_csv(segment_path, usecols=[0, 1], engine='c', on_bad_lines='skip')
+        return df.apply(pd.to_numeric, errors='coerce').dropna().to_numpy(dtype=np.float64)
+
 def read_motion_data(motion_per_sec_dir):
     """
     秒ごとの移動量データを読み込む
@@ -74,54 +114,44 @@ def read_motion_data(motion_per_sec_dir):
         motion_per_sec_dir (str): 秒ごとの移動量データディレクトリ
         
     Returns:
-        dict: {秒数: 移動量} の辞書
+        tuple: (移動量の配列, データが存在する秒のマスク) （どちらもインデックス = 秒数）
     """
-    sec_to_motion = {}
-    segment_files = [f for f in os.listdir(motion_per_sec_dir) if f.endswith('.txt') and 'sec.txt' in f]
+    segment_files = list_segment_files(motion_per_sec_dir)
+    if not segment_files:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool)
 
-    for segment_file in sorted(segment_files):
-        segment_path = os.path.join(motion_per_sec_dir, segment_file)
-        # ファイル名から時間範囲を取得（例: 0-14sec.txt -> start=0, end=14）
-        time_range = segment_file.replace('sec.txt', '')
-        start_sec, end_sec = map(int, time_range.split('-'))
-        
-        with open(segment_path, 'r') as f:
-            reader = csv.reader(f, delimiter=',')
-            header = next(reader)  # ヘッダー行をスキップ
-            for row in reader:
-                if not row or len(row) < 2:
-                    continue
-                try:
-                    # 期待フォーマット: 秒数, 移動量
-                    sec = int(float(row[0]))
-                    motion_amount = float(row[1])
-                    sec_to_motion[sec] = motion_amount
-                except Exception as e:
-                    print(f"[WARNING] Skipping invalid row in {segment_file}: {row}, Error: {e}")
-                    continue
+    # 全セグメントを読み込んで連結
+    data = np.concatenate([read_segment_file(segment_path) for segment_path in segment_files])
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool)
+
+    # 同じ秒が複数ある場合は後のセグメントの値を使用
+    secs = data[:, 0].astype(np.int64)
+    _, last_from_end = np.unique(secs[::-1], return_index=True)
+    keep = len(secs) - 1 - last_from_end
+    secs = secs[keep]
 
-    return sec_to_motion
+    # 秒数をインデックスとする密な配列に格納（データがない秒は0、メモリ帯域削減のためfloat32）
+    motion_arr = np.zeros(secs.max() + 1, dtype=np.float32)
+    valid_mask = np.zeros(secs.max() + 1, dtype=bool)
+    motion_arr[secs] = data[keep, 1]
+    valid_mask[secs] = True
 
-def classify_motion(sec_to_motion, threshold):
+    return motion_arr, valid_mask
+
+def classify_motion(motion_arr, valid_mask, threshold):
     """
     移動量に基づいて歩行状態を分類（2クラス: 移動/静止）
     
     Args:
-        sec_to_motion (dict): {秒数: 移動量} の辞書
+        motion_arr (numpy.ndarray): 秒ごとの移動量の配列（インデックス = 秒数）
+        valid_mask (numpy.ndarray): データが存在する秒のマスク
         threshold (float): 分類しきい値
         
     Returns:
-        dict: {秒数: 分類結果} の辞書（1: 移動, 0: 静止）
+        numpy.ndarray: 秒ごとの分類結果の配列（1: 移動, 0: 静止、データがない秒は静止）
     """
-    sec_to_classification = {}
-    
-    for sec, motion in sec_to_motion.items():
-        if motion >= threshold:
-            sec_to_classification[sec] = 1  # 移動
-        else:
-            sec_to_classification[sec] = 0  # 静止
-    
-    return sec_to_classification
+    return ((motion_arr >= threshold) & valid_mask).astype(np.int8)
 
 def align_data(annotation_data, sec_to_classification):
     """
@@ -129,25 +159,20 @@ def align_data(annotation_data, sec_to_classification):
     
     Args:
         annotation_data (list): 正解データのリスト
-        sec_to_classification (dict): {秒数: 分類結果} の辞書
+        sec_to_classification (numpy.ndarray): 秒ごとの分類結果の配列
         
     Returns:
-        tuple: (正解データ, 分類結果) のリスト
+        tuple: (正解データ, 分類結果) の配列
     """
-    aligned_annotation = []
-    aligned_classification = []
-    
     # 正解データの長さに合わせて処理
-    for sec in range(len(annotation_data)):
-        if sec in sec_to_classification:
-            aligned_annotation.append(annotation_data[sec])
-            aligned_classification.append(sec_to_classification[sec])
-        else:
-            # 分類結果がない場合は静止として扱う
-            aligned_annotation.append(annotation_data[sec])
-            aligned_classification.append(0)
-    
-    return aligned_annotation, aligned_classification
+    y_true = np.asarray(annotation_data, dtype=np.int64)
+    
+    # 分類結果がない秒は静止として扱う
+    y_pred = np.zeros(len(y_true), dtype=np.int8)
+    m = min(len(y_true), len(sec_to_classification))
+    y_pred[:m] = sec_to_classification[:m]
+    
+    return y_true, y_pred
 
 def calculate_confusion_matrix(y_true, y_pred):
     """
@@ -160,19 +185,15 @@ def calculate_confusion_matrix(y_true, y_pred):
     Returns:
         numpy.ndarray: 混同行列 [[TN, FP], [FN, TP]]
     """
-    tn = fp = fn = tp = 0
-    
-    for true_val, pred_val in zip(y_true, y_pred):
-        if true_val == 0 and pred_val == 0:
-            tn += 1  # True Negative
-        elif true_val == 0 and pred_val == 1:
-            fp += 1  # False Positive
-        elif true_val == 1 and pred_val == 0:
-            fn += 1  # False Negative
-        elif true_val == 1 and pred_val == 1:
-            tp += 1  # True Positive
-    
-    return np.array([[tn, fp], [fn, tp]])
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    
+    # 0/1 以外の値を含む組は集計しない
+    valid = (y_true >= 0) & (y_true <= 1) & (y_pred >= 0) & (y_pred <= 1)
+    
+    # (正解, 予測) を 0-3 のインデックスに変換して集計: 0=TN, 1=FP, 2=FN, 3=TP
+    idx = (y_true[valid] << 1) | y_pred[valid]
+    return np.bincount(idx, minlength=4).reshape(2, 2)
 
 def create_confusion_matrix_plot(y_true, y_pred, threshold, class_result_dir, video_name, threshold_name):
     """
@@ -190,37 +211,40 @@ def create_confusion_matrix_plot(y_true, y_pred, threshold, class_result_dir, vi
     cm = calculate_confusion_matrix(y_true, y_pred)
     
     # 混同行列のプロット
-    plt.figure(figsize=(8, 6))
+    # （しきい値ごとに別プロセスで1枚ずつ作成するため、図はプロットごとに作成して閉じる）
+    fig, ax = plt.subplots(figsize=(8, 6))
     
     # ヒートマップを手動で作成
-    im = plt.imshow(cm, interpolation='nearest', cmap='Blues')
-    plt.colorbar(im)
+    im = ax.imshow(cm, interpolation='nearest', cmap='Blues')
+    fig.colorbar(im)
     
     # ラベルを設定
     classes = ['Stay', 'Walk']
     tick_marks = np.arange(len(classes))
-    plt.xticks(tick_marks, classes)
-    plt.yticks(tick_marks, classes)
+    ax.set_xticks(tick_marks)
+    ax.set_xticklabels(classes)
+    ax.set_yticks(tick_marks)
+    ax.set_yticklabels(classes)
     
     # 値をプロット
     thresh = cm.max() / 2.
     for i in range(cm.shape[0]):
         for j in range(cm.shape[1]):
-            plt.text(j, i, format(cm[i, j], 'd'),
+            ax.text(j, i, format(cm[i, j], 'd'),
                     ha="center", va="center",
                     color="white" if cm[i, j] > thresh else "black")
     
-    plt.title(f'Confusion Matrix - {video_name} (Threshold: {threshold_name}={threshold})')
-    plt.xlabel('Estimated Walk Classification result')
-    plt.ylabel('Ground Truth')
+    ax.set_title(f'Confusion Matrix - {video_name} (Threshold: {threshold_name}={threshold})')
+    ax.set_xlabel('Estimated Walk Classification result')
+    ax.set_ylabel('Ground Truth')
     
     # ファイル名を設定
     output_filename = f"{video_name}_confusion_matrix_{threshold_name}.png"
     output_path = os.path.join(class_result_dir, output_filename)
     
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=200, bbox_inches='tight')
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=200, bbox_inches='tight')
+    plt.close(fig)
     
     print(f"[INFO] Saved confusion matrix: {output_filename}")
     
@@ -340,6 +364,54 @@ def save_evaluation_report(y_true, y_pred, threshold, class_result_dir, video_na
     
     return metrics['accuracy'], metrics
 
+def evaluate_threshold(threshold, threshold_name, annotation_data, motion_arr, valid_mask, class_result_dir, video_name):
+    """
+    1つのしきい値で分類・評価を行い、混同行列とレポートを保存
+    
+    Args:
+        threshold (float): 分類しきい値
+        threshold_name (str): しきい値の名前
+        annotation_data (list): 正解データのリスト
+        motion_arr (numpy.ndarray): 秒ごとの移動量の配列（インデックス = 秒数）
+        valid_mask (numpy.ndarray): データが存在する秒のマスク
+        class_result_dir (str): 出力ディレクトリ
+        video_name (str): 動画名
+        
+    Returns:
+        float: 精度 (Accuracy)
+    """
+    print(f"\n[INFO] Evaluating with threshold {threshold_name} = {threshold}")
+    
+    # 分類結果を生成
+    sec_to_classification = classify_motion(motion_arr, valid_mask, threshold)
+    
+    # データを揃える
+    y_true, y_pred = align_data(annotation_data, sec_to_classification)
+    
+    # 混同行列を作成して保存
+    cm = create_confusion_matrix_plot(y_true, y_pred, threshold, class_result_dir, video_name, threshold_name)
+    
+    # 評価レポートを保存
+    accuracy, report = save_evaluation_report(y_true, y_pred, threshold, class_result_dir, video_name, threshold_name)
+    
+    return accuracy
+
+def evaluate_threshold_with_log(*args):
+    """
+    evaluate_threshold を実行し、標準出力への出力をまとめて返す
+    （別プロセスで実行した場合にログの順序が入れ替わらないよう、呼び出し元でしきい値の順に表示する）
+    
+    Args:
+        *args: evaluate_threshold の引数
+        
+    Returns:
+        tuple: (精度 (Accuracy), 出力されたログ)
+    """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        accuracy = evaluate_threshold(*args)
+    return accuracy, log.getvalue()
+
 def main():
     if len(sys.argv) != 7:
         print("Usage: python evaluate.py <video_name> <motion_per_sec_dir> <class_result_dir> <walking_threshold1> <walking_threshold2> <annotation_dir>")
@@ -371,10 +443,10 @@ def main():
     
     # 移動量データを読み込み
     print("[INFO] Reading motion data...")
-    sec_to_motion = read_motion_data(motion_per_sec_dir)
-    print(f"[INFO] Read motion data for {len(sec_to_motion)} seconds")
+    motion_arr, valid_mask = read_motion_data(motion_per_sec_dir)
+    print(f"[INFO] Read motion data for {np.count_nonzero(valid_mask)} seconds")
     
-    if not sec_to_motion:
+    if not valid_mask.any():
         print("[ERROR] No motion data found")
         sys.exit(1)
     
@@ -384,21 +456,20 @@ def main():
         (walking_threshold2, "TH2")
     ]
     
-    for threshold, threshold_name in thresholds:
-        print(f"\n[INFO] Evaluating with threshold {threshold_name} = {threshold}")
-        
-        # 分類結果を生成
-        sec_to_classification = classify_motion(sec_to_motion, threshold)
-        
-        # データを揃える
-        y_true, y_pred = align_data(annotation_data, sec_to_classification)
-        
-        # 混同行列を作成して保存
-        cm = create_confusion_matrix_plot(y_true, y_pred, threshold, class_result_dir, video_name, threshold_name)
-        
-        # 評価レポートを保存
-        accuracy, report = save_evaluation_report(y_true, y_pred, threshold, class_result_dir, video_name, threshold_name)
-        
+    # しきい値ごとの評価は独立しているため、別プロセスで並行に実行
+    with ProcessPoolExecutor(max_workers=len(thresholds)) as executor:
+        futures = [executor.submit(evaluate_threshold_with_log, threshold, threshold_name, annotation_data,
+                                   motion_arr, valid_mask, class_result_dir, video_name)
+                   for threshold, threshold_name in thresholds]
+        results = [future.result() for future in futures]
+    
+    # 各しきい値のログはしきい値の順に表示
+    accuracies = []
+    for accuracy, log in results:
+        print(log, end='')
+        accuracies.append(accuracy)
+    
+    for (threshold, threshold_name), accuracy in zip(thresholds, accuracies):
         print(f"[INFO] Accuracy with {threshold_name}: {accuracy:.4f}")
     
     print("[INFO] Evaluation completed successfully")
@@ -3,22 +3,124 @@
 秒ごとの移動量データを1分ごとの棒グラフにプロットするスクリプト
 
 使用方法:
-python plot_move_amount_per_min.py <motion_per_sec_dir> <motion_per_min_dir> <video_name>
+python plot_move_amount_per_min.py <motion_per_sec_dir> <motion_per_min_dir> <video_name> <walking_threshold1> <walking_threshold2> <annotation_dir> [--singlecore] [--skip-empty] [--stream] [--renderer=pil|matplotlib]
 
 引数:
 - motion_per_sec_dir: 秒ごとの移動量データが保存されているディレクトリ
 - motion_per_min_dir: 1分ごとの棒グラフを保存するディレクトリ
 - video_name: 動画名（ファイル名に使用）
+- walking_threshold1: WALKING判定のしきい値
+- walking_threshold2: HOLD判定のしきい値
+- annotation_dir: 正解データディレクトリ
+- --singlecore: 1プロセスで順番にグラフを作成する（デバッグ用）
+- --skip-empty: 移動量データ・正解データがともにない分のグラフを作成しない
+- --stream: 移動量データ全体を読み込まず、分ごとに必要なセグメントファイルのみを読み込む（長い動画向け）
+- --renderer: グラフの描画方法（pil: PILで直接描画（デフォルト）, matplotlib: matplotlibで描画）
 """
 
 import sys
 import os
-import csv
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import math
+import functools
+import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
 from collections import defaultdict
 
+# 歩行判定結果の分類コード（-1: データなし）
+STAY, HOLD, WALK = 0, 1, 2
+NO_DATA = -1
+
+# セグメントファイル名から時間範囲を抽出する正規表現（例: "0-14sec.txt" -> "0", "14"）
+_SEGMENT_RE = re.compile(r'(\d+)-(\d+)sec\.txt')
+
+# Numbaのカーネルで分類する最小の秒数
+# （numbaの読み込みとキャッシュの読み込みに約0.3秒かかるため、np.where より速くなるのは約2000万秒以上）
+NUMBA_MIN_SECONDS = 20_000_000
+
+# 背景画像の1秒あたりの列数
+BG_SUBDIV = 10
+
+# 背景色の定義（RGBAのパレット、分類コードで直接参照し NO_DATA (-1) は末尾の白）
+# 歩行判定結果: walk→青色, hold→黄色, stay→赤色（正解データは 1→WALK, 0→STAY として同じパレットを使う）
+# （matplotlibを読み込まずに済むよう、matplotlibの色名のRGB値を直接記述）
+PALETTE = np.array([
+    [240 / 255, 128 / 255, 128 / 255, 0.3],  # lightcoral
+    [255 / 255, 255 / 255, 224 / 255, 0.3],  # lightyellow
+    [173 / 255, 216 / 255, 230 / 255, 0.3],  # lightblue
+    [255 / 255, 255 / 255, 255 / 255, 0.3],  # white
+])
+
+# 背景は1秒を BG_SUBDIV 列に分割した画像で描画し、各秒の中央80%（棒の幅）のみ着色する
+STRIPE_ALPHA = np.tile(np.where((np.arange(BG_SUBDIV) < BG_SUBDIV // 10) |
+                                (np.arange(BG_SUBDIV) >= BG_SUBDIV - BG_SUBDIV // 10), 0.0, 1.0), 60)
+
+# グラフの描画方法（先頭がデフォルト）
+RENDERERS = ('pil', 'matplotlib')
+
+# x軸の表示範囲（幅0.8の60本の棒に対するmatplotlibの自動範囲と同じ）
+PLOT_XLIM = (-3.39, 62.39)
+
+# PIL描画の画像サイズ、グラフ領域 (左, 上, 右, 下)
+PIL_SIZE = (1400, 800)
+PIL_PLOT_BOX = (90, 70, 1385, 735)
+
+def _blend(rgba, under):
+    """半透明色 rgba を不透明色 under の上に合成したRGB（0-255の整数）を返す"""
+    return tuple(int(round(255 * (rgba[3] * c + (1 - rgba[3]) * u))) for c, u in zip(rgba[:3], under))
+
+# PIL描画用の合成済みの色（背景色は白の上、棒の色は各背景色の上に合成）
+_BAR_RGBA = (70 / 255, 130 / 255, 180 / 255, 0.8)  # steelblue
+PIL_BG_COLORS = [_blend(rgba, (1, 1, 1)) for rgba in PALETTE]
+PIL_BAR_ON_BG = [_blend(_BAR_RGBA, [c / 255 for c in color]) for color in PIL_BG_COLORS]
+PIL_GRID_COLOR = _blend((0xb0 / 255, 0xb0 / 255, 0xb0 / 255, 0.3), (1, 1, 1))  # matplotlibのグリッド線の色
+
+# 各プロセスで使い回す1分ごとの棒グラフ用の図
+_minute_plot_cache = {}
+
+def list_segment_files(motion_per_sec_dir):
+    """
+    秒ごとの移動量データディレクトリ内のセグメントファイルを列挙する
+    
+    Args:
+        motion_per_sec_dir (str): 秒ごとの移動量データディレクトリ
+        
+    Returns:
+        list: セグメントファイルのパスのリスト（ファイル名順）
+    """
+    # DirEntryのキャッシュ済みの名前・種別を使い、ファイルごとのstatとパスの結合を省く
+    with os.scandir(motion_per_sec_dir) as it:
+        return sorted(entry.path for entry in it if entry.name.endswith('sec.txt') and entry.is_file())
+
+def index_segment_files(motion_per_sec_dir):
+    """
+    セグメントファイルを列挙し、それぞれが含む秒の範囲を調べる
+    
+    範囲はファイル名（例: "0-14sec.txt" -> 0-14秒）から取得し、
+    ファイル名から取得できない場合のみファイルを読み込んで調べる
+    
+    Args:
+        motion_per_sec_dir (str): 秒ごとの移動量データディレクトリ
+        
+    Returns:
+        list: (開始秒数, 終了秒数, ファイルのパス) のリスト（ファイル名順）
+    """
+    segment_index = []
+    for filepath in list_segment_files(motion_per_sec_dir):
+        match = _SEGMENT_RE.search(os.path.basename(filepath))
+        if match:
+            segment_index.append((int(match.group(1)), int(match.group(2)), filepath))
+            continue
+            
+        _, mask_arr = read_motion_files([filepath])
+        secs = np.flatnonzero(mask_arr)
+        if len(secs):
+            segment_index.append((int(secs[0]), int(secs[-1]), filepath))
+            
+    return segment_index
+
 def read_motion_data(motion_per_sec_dir):
     """
     秒ごとの移動量データを読み込む
@@ -27,37 +129,73 @@ def read_motion_data(motion_per_sec_dir):
         motion_per_sec_dir (str): 秒ごとの移動量データディレクトリ
         
     Returns:
-        dict: {秒数: 移動量} の辞書
+        tuple: (移動量の配列, データが存在する秒のマスク) （どちらもインデックス = 秒数）
+    """
+    return read_motion_files(list_segment_files(motion_per_sec_dir))
+
+def read_motion_files(segment_files, start_sec=0, num_secs=None):
     """
-    sec_to_motion = {}
+    セグメントファイルから秒ごとの移動量データを読み込む
+    
+    Args:
+        segment_files (list): セグメントファイルのパスのリスト（同じ秒は後のファイルの値を使用）
+        start_sec (int): 配列の先頭の秒数（これより前の秒は読み込まない）
+        num_secs (int): 配列の長さ（None の場合は最後のデータの秒まで）
+        
+    Returns:
+        tuple: (移動量の配列, データが存在する秒のマスク) （どちらもインデックス = 秒数 - start_sec）
+    """
+    empty_size = num_secs if num_secs is not None else 0
+    # pandasは読み込みに時間がかかるため、移動量データを読み込む場合のみ読み込む
+    import pandas as pd
+    
+    frames = []
     
-    # ディレクトリ内のすべてのsec.txtファイルを処理
-    for filename in os.listdir(motion_per_sec_dir):
-        if filename.endswith('sec.txt'):
-            filepath = os.path.join(motion_per_sec_dir, filename)
+    # すべてのsec.txtファイルを読み込み
+    for filepath in segment_files:
+        try:
+            # ヘッダー行をスキップし、秒数・移動量の2列をCパーサで一括読み込み（列数が不正な行はスキップ）
+            frames.append(pd.read_csv(filepath, header=0, usecols=[0, 1], names=['sec', 'motion'],
+                                      engine='c', on_bad_lines='skip'))
+        except pd.errors.EmptyDataError:
+            continue
+        except Exception as e:
+            print(f"[WARNING] Error reading {os.path.basename(filepath)}: {e}")
+            continue
             
-            try:
-                with open(filepath, 'r') as f:
-                    reader = csv.reader(f, delimiter=',')
-                    header = next(reader)  # ヘッダー行をスキップ
-                    
-                    for row in reader:
-                        if not row or len(row) < 2:
-                            continue
-                            
-                        try:
-                            sec = int(float(row[0]))
-                            motion_amount = float(row[1])
-                            sec_to_motion[sec] = motion_amount
-                        except (ValueError, IndexError) as e:
-                            print(f"[WARNING] Skipping invalid row in {filename}: {row}, Error: {e}")
-                            continue
-                            
-            except Exception as e:
-                print(f"[WARNING] Error reading {filename}: {e}")
-                continue
-                
-    return sec_to_motion
+    if not frames:
+        return np.zeros(empty_size, dtype=np.float32), np.zeros(empty_size, dtype=bool)
+        
+    # 全ファイルを連結してから、数値変換・重複除去をまとめて行う
+    df = pd.concat(frames, ignore_index=True)
+    
+    # 数値に変換できない行をスキップ
+    df = df.apply(pd.to_numeric, errors='coerce')
+    num_invalid = int(df.isna().any(axis=1).sum())
+    if num_invalid:
+        print(f"[WARNING] Skipping {num_invalid} invalid rows")
+        df = df.dropna()
+    # 同じ秒が複数ある場合は後に読み込んだファイルの値を使用
+    df['sec'] = df['sec'].astype(np.int64)
+    df = df.drop_duplicates('sec', keep='last')
+    
+    # 範囲内の秒のみを残し、start_sec からの相対秒数にする
+    secs = df['sec'].to_numpy() - start_sec
+    keep = secs >= 0
+    if num_secs is not None:
+        keep &= secs < num_secs
+    secs = secs[keep]
+    if len(secs) == 0:
+        return np.zeros(empty_size, dtype=np.float32), np.zeros(empty_size, dtype=bool)
+        
+    # 秒数をインデックスとする密な配列に格納（データがない秒は0、メモリ帯域削減のためfloat32）
+    size = num_secs if num_secs is not None else secs.max() + 1
+    motion_arr = np.zeros(size, dtype=np.float32)
+    mask_arr = np.zeros(size, dtype=bool)
+    motion_arr[secs] = df['motion'].to_numpy(dtype=np.float32)[keep]
+    mask_arr[secs] = True
+    
+    return motion_arr, mask_arr
 
 def read_annotation_data(annotation_dir, video_name):
     """
@@ -68,162 +206,555 @@ def read_annotation_data(annotation_dir, video_name):
         video_name (str): 動画名
         
     Returns:
-        dict: {秒数: 正解値} の辞書（1: 歩行, 0: 静止）
+        numpy.ndarray: 秒ごとの正解値の配列（1: 歩行, 0: 静止, -1: データなし）
     """
     annotation_file = os.path.join(annotation_dir, f"{video_name}.txt")
     
     if not os.path.exists(annotation_file):
         print(f"[WARNING] Annotation file not found: {annotation_file}")
-        return {}
-    
-    sec_to_annotation = {}
+        return np.full(0, -1, dtype=np.int8)
     
     try:
         with open(annotation_file, 'r') as f:
             # カンマ区切りで読み込み
             content = f.read().strip()
             if content:
-                values = content.split(',')
-                for sec, value in enumerate(values):
-                    try:
-                        sec_to_annotation[sec] = int(value.strip())
-                    except ValueError:
-                        print(f"[WARNING] Invalid annotation value at second {sec}: {value}")
-                        continue
+                # 全体をCで一括解析し、解析できない値や範囲外の値を含む場合のみ1つずつ解析する
+                num_values = content.count(',') + 1
+                try:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore', DeprecationWarning)
+                        parsed = np.fromstring(content, dtype=np.int64, sep=',')
+                except ValueError:
+                    parsed = np.zeros(0, dtype=np.int64)
+                if len(parsed) == num_values and np.all((parsed >= -128) & (parsed <= 127)):
+                    annotation_arr = parsed.astype(np.int8)
+                else:
+                    annotation_arr = parse_annotation_values(content.split(','))
             else:
                 print(f"[WARNING] Empty annotation file: {annotation_file}")
-                return {}
+                return np.full(0, -1, dtype=np.int8)
                 
     except Exception as e:
         print(f"[WARNING] Error reading annotation file {annotation_file}: {e}")
-        return {}
+        return np.full(0, -1, dtype=np.int8)
+    
+    return annotation_arr
+
+def parse_annotation_values(values):
+    """
+    正解データの値を1つずつ解析する（不正な値は -1 として扱う）
+    
+    Args:
+        values (list): 秒ごとの正解値の文字列のリスト
+        
+    Returns:
+        numpy.ndarray: 秒ごとの正解値の配列（1: 歩行, 0: 静止, -1: データなし）
+    """
+    annotation_arr = np.full(len(values), -1, dtype=np.int8)
+    for sec, value in enumerate(values):
+        try:
+            annotation_arr[sec] = int(value.strip())
+        except (ValueError, OverflowError):
+            print(f"[WARNING] Invalid annotation value at second {sec}: {value}")
+            continue
+    return annotation_arr
+
+def _classify_kernel(motion_arr, mask_arr, walking_threshold1, walking_threshold2, classification_arr):
+    """
+    移動量のしきい値判定とデータなしのマスクを1パスで行う
+    
+    （parallel=True のスレッドプールは描画用のプロセスプールのforkと両立しないため逐次ループ）
+    
+    Args:
+        motion_arr (numpy.ndarray): 秒ごとの移動量の配列
+        mask_arr (numpy.ndarray): データが存在する秒のマスク
+        walking_threshold1 (float): WALKING判定のしきい値
+        walking_threshold2 (float): HOLD判定のしきい値
+        classification_arr (numpy.ndarray): 分類コードの出力先（int8）
+    """
+    for i in range(motion_arr.size):
+        if not mask_arr[i]:
+            classification_arr[i] = NO_DATA
+        elif motion_arr[i] >= walking_threshold1:
+            classification_arr[i] = WALK
+        elif motion_arr[i] >= walking_threshold2:
+            classification_arr[i] = HOLD
+        else:
+            classification_arr[i] = STAY
+
+@functools.lru_cache(maxsize=1)
+def get_classify_kernel():
+    """
+    Numbaでコンパイルした分類カーネルを取得（1回だけ作成）
     
-    return sec_to_annotation
+    numbaは読み込みに時間がかかるため、NUMBA_MIN_SECONDS 秒以上のデータを分類する場合のみ読み込む
+    
+    Returns:
+        function: _classify_kernel をコンパイルした関数
+    """
+    from numba import njit
+    return njit(cache=True)(_classify_kernel)
 
-def classify_motion(sec_to_motion, walking_threshold1, walking_threshold2):
+def classify_motion(motion_arr, mask_arr, walking_threshold1, walking_threshold2):
     """
     移動量に基づいて歩行状態を分類
     
     Args:
-        sec_to_motion (dict): {秒数: 移動量} の辞書
+        motion_arr (numpy.ndarray): 秒ごとの移動量の配列
+        mask_arr (numpy.ndarray): データが存在する秒のマスク
         walking_threshold1 (float): WALKING判定のしきい値
         walking_threshold2 (float): HOLD判定のしきい値
         
     Returns:
-        dict: {秒数: 分類結果} の辞書（'walk', 'hold', 'stay'）
+        numpy.ndarray: 秒ごとの分類コードの配列（WALK, HOLD, STAY, データなしは NO_DATA）
     """
-    sec_to_classification = {}
+    # しきい値は移動量の配列と同じfloat32で比較する
+    walking_threshold1 = np.float32(walking_threshold1)
+    walking_threshold2 = np.float32(walking_threshold2)
     
-    for sec, motion in sec_to_motion.items():
-        if motion >= walking_threshold1:
-            sec_to_classification[sec] = 'walk'
-        elif motion >= walking_threshold2:
-            sec_to_classification[sec] = 'hold'
-        else:
-            sec_to_classification[sec] = 'stay'
+    if len(motion_arr) >= NUMBA_MIN_SECONDS:
+        classification_arr = np.empty(len(motion_arr), dtype=np.int8)
+        get_classify_kernel()(motion_arr, mask_arr, walking_threshold1, walking_threshold2, classification_arr)
+        return classification_arr
+        
+    classification_arr = np.where(motion_arr >= walking_threshold1, WALK,
+                                  np.where(motion_arr >= walking_threshold2, HOLD, STAY)).astype(np.int8)
+    classification_arr[~mask_arr] = NO_DATA
+    
+    return classification_arr
+
+def split_by_minute(arr, total_minutes, fill_value):
+    """
+    秒ごとの配列を分ごとの (分数, 60) の配列に変形する（範囲外の秒は fill_value で埋める）
+    
+    Args:
+        arr (numpy.ndarray): 秒ごとの配列
+        total_minutes (int): 分数
+        fill_value: 範囲外の秒に使う値
+        
+    Returns:
+        numpy.ndarray: (total_minutes, 60) の配列
+    """
+    by_minute = np.full(total_minutes * 60, fill_value, dtype=arr.dtype)
+    n = min(len(arr), len(by_minute))
+    by_minute[:n] = arr[:n]
+    return by_minute.reshape(total_minutes, 60)
+
+def get_minute_figure():
+    """
+    1分ごとの棒グラフ用の図を取得（初回のみ作成し、以降は同じプロセス内で使い回す）
+    
+    軸の範囲・目盛り・ラベル・グリッドなど分によらない設定は作成時に1回だけ行う
+    
+    Returns:
+        dict: 図、軸、タイトル、背景画像、棒グラフを格納した辞書
+    """
+    if not _minute_plot_cache:
+        # matplotlibは読み込みに時間がかかるため、matplotlibで描画する場合のみ読み込む
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.image
+        import matplotlib.pyplot as plt
+        
+        # レイアウトは描画時に tight_layout で調整する（保存解像度で直接描画するため dpi=200 で作成）
+        fig, ax = plt.subplots(figsize=(14, 8), dpi=200, layout='tight')
+        
+        # x方向はデータ座標、y方向は軸の高さ（0-1）で背景画像を配置（軸の表示範囲には影響させない）
+        bg_image = matplotlib.image.AxesImage(ax, extent=(-0.5, 59.5, 0.0, 1.0), interpolation='nearest',
+                                              transform=ax.get_xaxis_transform(), zorder=0)
+        ax.add_image(bg_image)
+        
+        # 棒グラフ（0-59秒の60本の棒）は作成しておき、各分では高さのみ更新する
+        bars = ax.bar(range(60), np.zeros(60), width=0.8, color='steelblue', alpha=0.8)
+        
+        # グラフの設定
+        title = ax.set_title("", fontsize=10)
+        ax.set_xlim(PLOT_XLIM)
+        ax.set_xlabel("Second (0-59)")
+        ax.set_ylabel("Motion Amount (sqrt(x^2+z^2))")
+        ax.set_xticks(range(0, 60, 5), [str(i) for i in range(0, 60, 5)])  # 5秒ごとにラベル
+        ax.grid(True, axis='y', alpha=0.3)
+        
+        _minute_plot_cache.update(fig=fig, ax=ax, title=title, bg_image=bg_image, bars=bars)
+    
+    return _minute_plot_cache
+
+def render_minute_matplotlib(minute, minute_values, minute_bg_codes, output_path, video_name):
+    """
+    1分間の棒グラフをmatplotlibで作成して保存（背景色付き）
+    
+    Args:
+        minute (int): 分
+        minute_values (numpy.ndarray): その分の秒ごとの移動量（長さ60）
+        minute_bg_codes (numpy.ndarray): その分の背景の分類コード（(2, 60)、行0: 正解データ, 行1: 歩行判定結果）
+        output_path (str): 出力ファイルのパス
+        video_name (str): 動画名
+    """
+    plot = get_minute_figure()
+    ax = plot['ax']
+    
+    # 背景色の画像を更新（行0: 上半分=正解データ, 行1: 下半分=歩行判定結果、データがない場合は白）
+    bg = np.repeat(PALETTE[minute_bg_codes], BG_SUBDIV, axis=1)
+    bg[..., 3] *= STRIPE_ALPHA
+    plot['bg_image'].set_data(bg)
     
-    return sec_to_classification
+    # 棒グラフの高さを更新
+    for rect, height in zip(plot['bars'], minute_values.tolist()):
+        rect.set_height(height)
+    
+    # y軸の範囲は最大値の5%の余白をとる（データがない場合は0-1）
+    max_value = float(minute_values.max())
+    ax.set_ylim(0.0, max_value * 1.05 if max_value > 0 else 1.0)
+    
+    # タイトルのテキストのみ更新
+    plot['title'].set_text(f"Motion per Second: {video_name} - Minute {minute} ({minute*60}-{minute*60+59}sec)\n"
+                           f"Top half: Ground Truth (Blue=Walk, Red=Stay)\n"
+                           f"Bottom half: Classification (Blue=Walk, Yellow=Hold, Red=Stay)")
+    
+    # 描画したキャンバスのRGBAバッファをそのままPILで書き出す（savefigの保存処理を省略）
+    # PNGの圧縮レベルを下げて書き出しを高速化（ファイルサイズは多少大きくなる）
+    fig = plot['fig']
+    fig.canvas.draw()
+    Image.fromarray(np.asarray(fig.canvas.buffer_rgba())[..., :3]).save(output_path, compress_level=1)
 
-def create_minute_plots(sec_to_motion, sec_to_annotation, sec_to_classification, motion_per_min_dir, video_name):
+@functools.lru_cache(maxsize=None)
+def get_pil_font(size):
+    """
+    PIL描画用のフォントを取得（サイズごとに1回だけ読み込む）
+    
+    Args:
+        size (int): フォントサイズ（ピクセル）
+        
+    Returns:
+        PIL.ImageFont: フォント（DejaVuSansがない場合はPILのデフォルトフォント）
+    """
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:
+            # Pillow 10.1 より前はサイズ指定不可
+            return ImageFont.load_default()
+
+def get_nice_ticks(y_max, max_ticks=8):
+    """
+    0からy_maxまでの区切りのよい目盛りを計算
+    
+    Args:
+        y_max (float): y軸の最大値
+        max_ticks (int): 目盛りの最大数の目安
+        
+    Returns:
+        tuple: (目盛りの値のリスト, 小数点以下の桁数)
+    """
+    raw_step = y_max / max_ticks
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw_step * (1 - 1e-9))
+    decimals = next(d for d in range(10) if abs(round(step, d) - step) < step * 1e-6)
+    ticks = [i * step for i in range(int(y_max / step * (1 + 1e-9)) + 1)]
+    return ticks, decimals
+
+def render_minute_pil(minute, minute_values, minute_bg_codes, output_path, video_name):
+    """
+    1分間の棒グラフをPILで直接描画して保存（背景色付き）
+    
+    背景・棒は矩形の塗りつぶしのみで描画し、半透明色は白背景・背景色と事前に合成した色を使う
+    
+    Args:
+        minute (int): 分
+        minute_values (numpy.ndarray): その分の秒ごとの移動量（長さ60）
+        minute_bg_codes (numpy.ndarray): その分の背景の分類コード（(2, 60)、行0: 正解データ, 行1: 歩行判定結果）
+        output_path (str): 出力ファイルのパス
+        video_name (str): 動画名
+    """
+    left, top, right, bottom = PIL_PLOT_BOX
+    middle = (top + bottom) / 2
+    
+    # y軸の範囲はmatplotlibと同様に最大値の5%の余白をとる（データがない場合は0-1）
+    max_value = float(minute_values.max())
+    y_max = max_value * 1.05 if max_value > 0 else 1.0
+    
+    x_scale = (right - left) / (PLOT_XLIM[1] - PLOT_XLIM[0])
+    y_scale = (bottom - top) / y_max
+    
+    img = Image.new('RGB', PIL_SIZE, 'white')
+    draw = ImageDraw.Draw(img)
+    font = get_pil_font(14)
+    
+    annotation_codes, classification_codes = minute_bg_codes.tolist()
+    
+    # 背景（上半分: 正解データ, 下半分: 歩行判定結果、データがない場合は白のまま）
+    for sec in range(60):
+        x0 = left + (sec - 0.4 - PLOT_XLIM[0]) * x_scale
+        x1 = left + (sec + 0.4 - PLOT_XLIM[0]) * x_scale
+        if annotation_codes[sec] != NO_DATA:
+            draw.rectangle([x0, top, x1, middle], fill=PIL_BG_COLORS[annotation_codes[sec]])
+        if classification_codes[sec] != NO_DATA:
+            draw.rectangle([x0, middle, x1, bottom], fill=PIL_BG_COLORS[classification_codes[sec]])
+    
+    # y軸の目盛りとグリッド線
+    ticks, decimals = get_nice_ticks(y_max)
+    for tick in ticks:
+        y = bottom - tick * y_scale
+        draw.line([(left, y), (right, y)], fill=PIL_GRID_COLOR)
+        draw.line([(left - 5, y), (left, y)], fill='black')
+        draw.text((left - 8, y), f"{tick:.{decimals}f}", fill='black', font=font, anchor='rm')
+    
+    # 棒グラフ（背景の縞と同じ幅なので、重なる背景色ごとに合成済みの色で塗る）
+    for sec, value in enumerate(minute_values.tolist()):
+        if value <= 0:
+            continue
+        x0 = left + (sec - 0.4 - PLOT_XLIM[0]) * x_scale
+        x1 = left + (sec + 0.4 - PLOT_XLIM[0]) * x_scale
+        y0 = bottom - value * y_scale
+        draw.rectangle([x0, max(y0, middle), x1, bottom], fill=PIL_BAR_ON_BG[classification_codes[sec]])
+        if y0 < middle:
+            draw.rectangle([x0, y0, x1, middle], fill=PIL_BAR_ON_BG[annotation_codes[sec]])
+    
+    # x軸の目盛り（5秒ごと）と枠線
+    for sec in range(0, 60, 5):
+        x = left + (sec - PLOT_XLIM[0]) * x_scale
+        draw.line([(x, bottom), (x, bottom + 5)], fill='black')
+        draw.text((x, bottom + 8), str(sec), fill='black', font=font, anchor='mt')
+    draw.rectangle([left, top, right, bottom], outline='black')
+    
+    # タイトルと軸ラベル
+    title_lines = [f"Motion per Second: {video_name} - Minute {minute} ({minute*60}-{minute*60+59}sec)",
+                   "Top half: Ground Truth (Blue=Walk, Red=Stay)",
+                   "Bottom half: Classification (Blue=Walk, Yellow=Hold, Red=Stay)"]
+    for i, line in enumerate(title_lines):
+        draw.text((PIL_SIZE[0] / 2, 8 + i * 18), line, fill='black', font=font, anchor='ma')
+    draw.text(((left + right) / 2, bottom + 30), "Second (0-59)", fill='black', font=font, anchor='mt')
+    ylabel = get_pil_ylabel()
+    img.paste(ylabel, (8, int(middle) - ylabel.height // 2))
+    
+    img.save(output_path, compress_level=1)
+
+@functools.lru_cache(maxsize=1)
+def get_pil_ylabel():
+    """
+    y軸ラベルを縦書きに回転した画像を取得（1回だけ作成）
+    
+    Returns:
+        PIL.Image.Image: y軸ラベルの画像
+    """
+    font = get_pil_font(14)
+    text = "Motion Amount (sqrt(x^2+z^2))"
+    x0, y0, x1, y1 = font.getbbox(text)
+    label = Image.new('RGB', (x1, y1 + 2), 'white')
+    ImageDraw.Draw(label).text((0, 0), text, fill='black', font=font)
+    return label.rotate(90, expand=True)
+
+def render_minute(minute, minute_values, minute_bg_codes, motion_per_min_dir, video_name, renderer='pil'):
+    """
+    1分間の棒グラフを作成して保存（背景色付き）
+    
+    Args:
+        minute (int): 分
+        minute_values (numpy.ndarray): その分の秒ごとの移動量（長さ60）
+        minute_bg_codes (numpy.ndarray): その分の背景の分類コード（(2, 60)、行0: 正解データ, 行1: 歩行判定結果）
+        motion_per_min_dir (str): 出力ディレクトリ
+        video_name (str): 動画名
+        renderer (str): 描画方法（'pil' または 'matplotlib'）
+        
+    Returns:
+        str: 保存したファイル名
+    """
+    # ファイル名を分ごとに設定
+    output_filename = f"{video_name}_motion_minute_{minute:02d}_{minute*60}-{minute*60+59}sec.png"
+    output_path = os.path.join(motion_per_min_dir, output_filename)
+    
+    if renderer == 'matplotlib':
+        render_minute_matplotlib(minute, minute_values, minute_bg_codes, output_path, video_name)
+    else:
+        render_minute_pil(minute, minute_values, minute_bg_codes, output_path, video_name)
+    
+    return output_filename
+
+def create_minute_plots(motion_arr, annotation_arr, classification_arr, motion_per_min_dir, video_name, singlecore=False,
+                        renderer='pil', skip_empty=False):
     """
     1分ごとの棒グラフを作成（背景色付き）
     
+    各分のグラフは独立しているので、複数プロセスで並行に作成する
+    
     Args:
-        sec_to_motion (dict): {秒数: 移動量} の辞書
-        sec_to_annotation (dict): {秒数: 正解値} の辞書
-        sec_to_classification (dict): {秒数: 分類結果} の辞書
+        motion_arr (numpy.ndarray): 秒ごとの移動量の配列
+        annotation_arr (numpy.ndarray): 秒ごとの正解値の配列（-1: データなし）
+        classification_arr (numpy.ndarray): 秒ごとの分類コードの配列（NO_DATA: データなし）
         motion_per_min_dir (str): 出力ディレクトリ
         video_name (str): 動画名
+        singlecore (bool): Trueの場合は1プロセスで順番に作成する（デバッグ用）
+        renderer (str): 描画方法（'pil' または 'matplotlib'）
+        skip_empty (bool): Trueの場合は移動量・正解データがともにない分のグラフを作成しない
     """
-    if not sec_to_motion:
+    if len(motion_arr) == 0:
         print("[ERROR] No motion data found")
         return
         
     # 最大秒数を取得
-    max_sec = max(sec_to_motion.keys())
+    max_sec = len(motion_arr) - 1
     total_minutes = (max_sec // 60) + 1
     
     print(f"[INFO] Creating plots for {total_minutes} minutes (0-{max_sec} seconds)")
     
-    # 色の定義
-    # 正解データ: 1→青色, 0→赤色
-    annotation_colors = {1: 'lightblue', 0: 'lightcoral'}
-    # 歩行判定結果: walk→青色, hold→黄色, stay→赤色
-    classification_colors = {'walk': 'lightblue', 'hold': 'lightyellow', 'stay': 'lightcoral'}
-    
-    # 各分ごとにプロットを作成
-    for minute in range(total_minutes):
-        plt.figure(figsize=(14, 8))
-        
-        # その分の秒ごとの移動量を取得（0-59秒の範囲）
-        minute_values = []
-        annotation_bg_colors = []
-        classification_bg_colors = []
-        
-        # 0-59秒の範囲で移動量を取得（データがない場合は0）
-        for sec in range(60):
-            abs_sec = minute * 60 + sec
-            if abs_sec in sec_to_motion:
-                minute_values.append(sec_to_motion[abs_sec])
-            else:
-                minute_values.append(0.0)
-            
-            # 正解データの背景色
-            if abs_sec in sec_to_annotation:
-                annotation_bg_colors.append(annotation_colors[sec_to_annotation[abs_sec]])
-            else:
-                annotation_bg_colors.append('white')  # データがない場合は白
-            
-            # 歩行判定結果の背景色
-            if abs_sec in sec_to_classification:
-                classification_bg_colors.append(classification_colors[sec_to_classification[abs_sec]])
-            else:
-                classification_bg_colors.append('white')  # データがない場合は白
+    # 正解データを背景色用の分類コードに変換（1→WALK, 0→STAY, それ以外→NO_DATA）
+    annotation_codes = np.where(annotation_arr == 1, WALK, np.where(annotation_arr == 0, STAY, NO_DATA)).astype(np.int8)
+    
+    # 全体を分ごとの配列に一括で変形（データがない秒は移動量0・背景は白）
+    minutes = np.arange(total_minutes)
+    minute_values = split_by_minute(motion_arr, total_minutes, 0.0)
+    minute_bg_codes = np.stack([split_by_minute(annotation_codes, total_minutes, NO_DATA),
+                                split_by_minute(classification_arr, total_minutes, NO_DATA)], axis=1)
+    
+    # 移動量データ（分類コード）・正解データがともにない分はスキップ
+    if skip_empty:
+        non_empty = (minute_bg_codes != NO_DATA).any(axis=(1, 2))
+        print(f"[INFO] Skipping {np.count_nonzero(~non_empty)} empty minutes")
+        minutes, minute_values, minute_bg_codes = minutes[non_empty], minute_values[non_empty], minute_bg_codes[non_empty]
         
-        # 背景色を設定（各秒ごとの背景）
-        max_value = max(minute_values) if minute_values else 1.0
+    num_plots = len(minutes)
+    if num_plots == 0:
+        return
+    minutes = minutes.tolist()
+    args = (minutes, minute_values, minute_bg_codes,
+            [motion_per_min_dir] * num_plots, [video_name] * num_plots, [renderer] * num_plots)
+    
+    if singlecore or num_plots == 1:
+        output_filenames = list(map(render_minute, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=min(num_plots, os.cpu_count() or 1)) as executor:
+            output_filenames = list(executor.map(render_minute, *args))
         
-        # 正解データの背景（上半分の背景）
-        for i, color in enumerate(annotation_bg_colors):
-            plt.axvspan(i-0.4, i+0.4, ymin=0.5, ymax=1.0, color=color, alpha=0.3)
+    for minute, output_filename in zip(minutes, output_filenames):
+        print(f"[INFO] Saved minute {minute} motion plot: {output_filename}")
+
+def find_last_second(segment_index):
+    """
+    移動量データが存在する最後の秒数を、終了秒数が大きいセグメントファイルから順に読み込んで調べる
+    
+    Args:
+        segment_index (list): (開始秒数, 終了秒数, ファイルのパス) のリスト
         
-        # 歩行判定結果の背景（下半分の背景）
-        for i, color in enumerate(classification_bg_colors):
-            plt.axvspan(i-0.4, i+0.4, ymin=0.0, ymax=0.5, color=color, alpha=0.3)
+    Returns:
+        int: 最後の秒数（データがない場合は -1）
+    """
+    for last_end_sec in sorted({end_sec for _, end_sec, _ in segment_index}, reverse=True):
+        last_segments = [(start_sec, path) for start_sec, end_sec, path in segment_index if end_sec == last_end_sec]
         
-        # 棒グラフを作成（0-59秒の60本の棒）
-        plt.bar(range(60), minute_values, width=0.8, color='steelblue', alpha=0.8)
+        # 先頭からの配列を作らないよう、それらのファイルの開始秒数からの配列として読み込む
+        start_sec = min(start_sec for start_sec, _ in last_segments)
+        _, mask_arr = read_motion_files([path for _, path in last_segments], start_sec)
+        if mask_arr.any():
+            return start_sec + len(mask_arr) - 1
+    return -1
+
+def render_minute_from_segments(minute, segment_files, minute_annotation_codes, walking_threshold1, walking_threshold2,
+                                motion_per_min_dir, video_name, renderer='pil', skip_empty=False):
+    """
+    1分間に対応するセグメントファイルのみを読み込み、分類して棒グラフを作成・保存
+    
+    Args:
+        minute (int): 分
+        segment_files (list): その分の秒を含むセグメントファイルのパスのリスト
+        minute_annotation_codes (numpy.ndarray): その分の正解データの分類コード（長さ60、NO_DATA: データなし）
+        walking_threshold1 (float): WALKING判定のしきい値
+        walking_threshold2 (float): HOLD判定のしきい値
+        motion_per_min_dir (str): 出力ディレクトリ
+        video_name (str): 動画名
+        renderer (str): 描画方法（'pil' または 'matplotlib'）
+        skip_empty (bool): Trueの場合は移動量・正解データがともにない分のグラフを作成しない
         
-        # グラフの設定
-        plt.title(f"Motion per Second: {video_name} - Minute {minute} ({minute*60}-{minute*60+59}sec)\n"
-                 f"Top half: Ground Truth (Blue=Walk, Red=Stay)\n"
-                 f"Bottom half: Classification (Blue=Walk, Yellow=Hold, Red=Stay)", fontsize=10)
-        plt.xlabel("Second (0-59)")
-        plt.ylabel("Motion Amount (sqrt(x^2+z^2))")
-        plt.xticks(range(0, 60, 5), [str(i) for i in range(0, 60, 5)])  # 5秒ごとにラベル
-        plt.grid(True, axis='y', alpha=0.3)
-        
-        # ファイル名を分ごとに設定
-        output_filename = f"{video_name}_motion_minute_{minute:02d}_{minute*60}-{minute*60+59}sec.png"
-        output_path = os.path.join(motion_per_min_dir, output_filename)
-        
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=200, bbox_inches='tight')
-        plt.close()
+    Returns:
+        str: 保存したファイル名（スキップした場合は None）
+    """
+    # その分の60秒分のみの配列として読み込み（データがない秒は移動量0）
+    minute_values, minute_mask = read_motion_files(segment_files, minute * 60, 60)
+    
+    minute_classification = classify_motion(minute_values, minute_mask, walking_threshold1, walking_threshold2)
+    minute_bg_codes = np.stack([minute_annotation_codes, minute_classification])
+    
+    if skip_empty and (minute_bg_codes == NO_DATA).all():
+        return None
         
-        print(f"[INFO] Saved minute {minute} motion plot: {output_filename}")
+    return render_minute(minute, minute_values, minute_bg_codes, motion_per_min_dir, video_name, renderer)
+
+def create_minute_plots_streaming(segment_index, max_sec, annotation_arr, walking_threshold1, walking_threshold2,
+                                  motion_per_min_dir, video_name, singlecore=False, renderer='pil', skip_empty=False):
+    """
+    1分ごとの棒グラフを、分ごとに必要なセグメントファイルのみを読み込みながら作成（背景色付き）
+    
+    移動量データ全体を読み込まないため、動画の長さによらずメモリ使用量が一定になる
+    
+    Args:
+        segment_index (list): (開始秒数, 終了秒数, ファイルのパス) のリスト
+        max_sec (int): 移動量データが存在する最後の秒数
+        annotation_arr (numpy.ndarray): 秒ごとの正解値の配列（-1: データなし）
+        walking_threshold1 (float): WALKING判定のしきい値
+        walking_threshold2 (float): HOLD判定のしきい値
+        motion_per_min_dir (str): 出力ディレクトリ
+        video_name (str): 動画名
+        singlecore (bool): Trueの場合は1プロセスで順番に作成する（デバッグ用）
+        renderer (str): 描画方法（'pil' または 'matplotlib'）
+        skip_empty (bool): Trueの場合は移動量・正解データがともにない分のグラフを作成しない
+    """
+    total_minutes = (max_sec // 60) + 1
+    
+    print(f"[INFO] Creating plots for {total_minutes} minutes (0-{max_sec} seconds)")
+    
+    # 各分の秒を含むセグメントファイルを選択
+    # （ファイル名の終了秒数は端数の1秒を含まない場合があるため、1秒広げて判定する）
+    minutes = list(range(total_minutes))
+    minute_segment_files = [[path for start_sec, end_sec, path in segment_index
+                             if start_sec <= minute * 60 + 59 and end_sec + 1 >= minute * 60]
+                            for minute in minutes]
+    
+    # 正解データを背景色用の分類コードに変換（1→WALK, 0→STAY, それ以外→NO_DATA）
+    annotation_codes = np.where(annotation_arr == 1, WALK, np.where(annotation_arr == 0, STAY, NO_DATA)).astype(np.int8)
+    minute_annotation_codes = split_by_minute(annotation_codes, total_minutes, NO_DATA)
+    
+    args = (minutes, minute_segment_files, minute_annotation_codes,
+            [walking_threshold1] * total_minutes, [walking_threshold2] * total_minutes,
+            [motion_per_min_dir] * total_minutes, [video_name] * total_minutes,
+            [renderer] * total_minutes, [skip_empty] * total_minutes)
+    
+    if singlecore or total_minutes == 1:
+        output_filenames = list(map(render_minute_from_segments, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=min(total_minutes, os.cpu_count() or 1)) as executor:
+            output_filenames = list(executor.map(render_minute_from_segments, *args))
+            
+    if skip_empty:
+        print(f"[INFO] Skipping {output_filenames.count(None)} empty minutes")
+    for minute, output_filename in zip(minutes, output_filenames):
+        if output_filename is not None:
+            print(f"[INFO] Saved minute {minute} motion plot: {output_filename}")
 
 def main():
-    if len(sys.argv) != 7:
-        print("Usage: python plot_move_amount_per_min.py <motion_per_sec_dir> <motion_per_min_dir> <video_name> <walking_threshold1> <walking_threshold2> <annotation_dir>")
+    # "--" で始まる引数はオプションとして扱う
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    
+    valid_options = ('--singlecore', '--skip-empty', '--stream') + tuple(f"--renderer={renderer}" for renderer in RENDERERS)
+    if len(args) != 6 or any(option not in valid_options for option in options):
+        print("Usage: python plot_move_amount_per_min.py <motion_per_sec_dir> <motion_per_min_dir> <video_name> <walking_threshold1> <walking_threshold2> <annotation_dir> [--singlecore] [--skip-empty] [--stream] [--renderer=pil|matplotlib]")
         sys.exit(1)
         
-    motion_per_sec_dir = sys.argv[1]
-    motion_per_min_dir = sys.argv[2]
-    video_name = sys.argv[3]
-    walking_threshold1 = float(sys.argv[4])
-    walking_threshold2 = float(sys.argv[5])
-    annotation_dir = sys.argv[6]
+    motion_per_sec_dir = args[0]
+    motion_per_min_dir = args[1]
+    video_name = args[2]
+    walking_threshold1 = float(args[3])
+    walking_threshold2 = float(args[4])
+    annotation_dir = args[5]
+    singlecore = '--singlecore' in options
+    skip_empty = '--skip-empty' in options
+    stream = '--stream' in options
+    renderer = RENDERERS[0]
+    for option in options:
+        if option.startswith('--renderer='):
+            renderer = option.split('=', 1)[1]
     
     print(f"[INFO] Motion per sec directory: {motion_per_sec_dir}")
     print(f"[INFO] Motion per min directory: {motion_per_min_dir}")
@@ -231,35 +762,68 @@ def main():
     print(f"[INFO] Walking threshold 1: {walking_threshold1}")
     print(f"[INFO] Walking threshold 2: {walking_threshold2}")
     print(f"[INFO] Annotation directory: {annotation_dir}")
+    print(f"[INFO] Single core: {singlecore}")
+    print(f"[INFO] Skip empty minutes: {skip_empty}")
+    print(f"[INFO] Stream segments: {stream}")
+    print(f"[INFO] Renderer: {renderer}")
     
     # 出力ディレクトリが存在しない場合は作成
     if not os.path.exists(motion_per_min_dir):
         os.makedirs(motion_per_min_dir)
         print(f"[INFO] Created output directory: {motion_per_min_dir}")
     
+    if stream:
+        # セグメントファイルの秒の範囲のみを調べ、移動量データは分ごとに読み込む
+        print("[INFO] Indexing motion data segments...")
+        segment_index = index_segment_files(motion_per_sec_dir)
+        
+        # 最大秒数は最後のセグメントファイルの実際のデータから取得
+        # （ファイル名の終了秒数は端数の1秒を含まない場合があり、それが分の境界にかかると最後の分が欠けるため）
+        max_sec = find_last_second(segment_index)
+        
+        if max_sec < 0:
+            print("[ERROR] No motion data found")
+            sys.exit(1)
+            
+        print(f"[INFO] Indexed {len(segment_index)} segment files (0-{max_sec} seconds)")
+        
+        # 正解データを読み込み
+        print("[INFO] Reading annotation data...")
+        annotation_arr = read_annotation_data(annotation_dir, video_name)
+        print(f"[INFO] Read annotation data for {np.count_nonzero(annotation_arr != -1)} seconds")
+        
+        # 分ごとに移動量データを読み込んで歩行判定し、棒グラフを作成
+        print("[INFO] Creating minute-by-minute plots...")
+        create_minute_plots_streaming(segment_index, max_sec, annotation_arr, walking_threshold1, walking_threshold2,
+                                      motion_per_min_dir, video_name, singlecore, renderer, skip_empty)
+        
+        print("[INFO] Plot creation completed successfully")
+        return
+    
     # 秒ごとの移動量データを読み込み
     print("[INFO] Reading motion data...")
-    sec_to_motion = read_motion_data(motion_per_sec_dir)
+    motion_arr, mask_arr = read_motion_data(motion_per_sec_dir)
     
-    if not sec_to_motion:
+    if not mask_arr.any():
         print("[ERROR] No motion data found")
         sys.exit(1)
         
-    print(f"[INFO] Read motion data for {len(sec_to_motion)} seconds")
+    print(f"[INFO] Read motion data for {np.count_nonzero(mask_arr)} seconds")
     
     # 正解データを読み込み
     print("[INFO] Reading annotation data...")
-    sec_to_annotation = read_annotation_data(annotation_dir, video_name)
-    print(f"[INFO] Read annotation data for {len(sec_to_annotation)} seconds")
+    annotation_arr = read_annotation_data(annotation_dir, video_name)
+    print(f"[INFO] Read annotation data for {np.count_nonzero(annotation_arr != -1)} seconds")
     
     # 歩行判定結果を生成
     print("[INFO] Classifying motion...")
-    sec_to_classification = classify_motion(sec_to_motion, walking_threshold1, walking_threshold2)
-    print(f"[INFO] Generated classification for {len(sec_to_classification)} seconds")
+    classification_arr = classify_motion(motion_arr, mask_arr, walking_threshold1, walking_threshold2)
+    print(f"[INFO] Generated classification for {np.count_nonzero(classification_arr != NO_DATA)} seconds")
     
     # 1分ごとの棒グラフを作成
     print("[INFO] Creating minute-by-minute plots...")
-    create_minute_plots(sec_to_motion, sec_to_annotation, sec_to_classification, motion_per_min_dir, video_name)
+    create_minute_plots(motion_arr, annotation_arr, classification_arr, motion_per_min_dir, video_name, singlecore, renderer,
+                        skip_empty)
     
     print("[INFO] Plot creation completed successfully")
 